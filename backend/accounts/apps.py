@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'accounts'  # <--- THIS must be exactly 'accounts'
\ No newline at end of file
+    name = 'accounts'  # <--- THIS must be exactly 'accounts'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
\ No newline at end of file
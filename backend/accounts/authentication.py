@@ -0,0 +1,60 @@
+"""Token authentication with a short-lived cache of token -> user lookups.
+
+DRF's `TokenAuthentication` joins `authtoken_token` and the user table on
+every authenticated request. `CachedTokenAuthentication` keeps the resolved
+user in the default cache for `TOKEN_CACHE_TIMEOUT` seconds, so repeat
+requests with the same token make no query at all. Entries are keyed by a
+hash of the token, never the token itself, and are dropped by the signals in
+`accounts.signals` when the token is deleted (logout) or the user is saved
+(password change, deactivation, profile edits).
+
+Revocation only reaches the cache the signal ran against, so caching needs a
+cache shared by every worker (CACHE_BACKEND=file or redis); with the default
+per-process local memory cache TOKEN_CACHE_TIMEOUT defaults to 0, which turns
+it off.
+
+An unknown or revoked token makes the request anonymous instead of failing
+it, so a client holding a stale token can still use the public endpoints;
+views that require a user answer 401 as usual.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def token_cache_key(key):
+    return 'auth-token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def forget_tokens(keys):
+    """Drop cached lookups of the given token keys."""
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """`TokenAuthentication` that caches the token's user for a short time."""
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except exceptions.AuthenticationFailed:
+            # Stale token: carry on anonymously; permission checks still apply
+            return None
+
+    def authenticate_credentials(self, key):
+        timeout = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 0)
+        if timeout <= 0:
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        if user is None:
+            user, _token = super().authenticate_credentials(key)
+            cache.set(cache_key, user, timeout)
+        elif not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        # request.auth is the token; build it from the cached user instead of querying it
+        return user, Token(key=key, user=user)
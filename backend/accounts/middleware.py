@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+
+
+class LastSeenMiddleware:
+    """Record when each authenticated user was last active, at most once per interval.
+
+    The cache's atomic `add` decides which request gets to write, so users
+    are written at most once per `LAST_SEEN_INTERVAL` seconds (300 by
+    default) with a single UPDATE and other requests cost no query. Users
+    are taken as resolved by the view (DRF token/session authentication);
+    a still-lazy session user is not loaded just for this.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = request.__dict__.get('user')
+        if isinstance(user, SimpleLazyObject):
+            user = None if user._wrapped is empty else user._wrapped
+        if user is not None and user.is_authenticated:
+            self.touch(user)
+        return response
+
+    def touch(self, user):
+        interval = getattr(settings, 'LAST_SEEN_INTERVAL', 300)
+        if cache.add(f'last-seen:{user.pk}', 1, timeout=interval):
+            type(user)._default_manager.filter(pk=user.pk).update(last_seen=timezone.now())
@@ -10,6 +10,9 @@ class User(AbstractUser):
     is_admin = models.BooleanField(default=False)
     is_student = models.BooleanField(default=True)
 
+    # Written by accounts.middleware.LastSeenMiddleware, at most once per LAST_SEEN_INTERVAL
+    last_seen = models.DateTimeField(null=True, blank=True)
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []  # No additional required fields for createsuperuser
 
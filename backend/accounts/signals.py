@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_tokens
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """Logout (token deletion) takes effect immediately, not after the cache TTL."""
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, raw=False, **kwargs):
+    """Password changes and deactivation reach cached token lookups at once."""
+    if not raw:
+        forget_tokens(Token.objects.filter(user=instance).values_list('key', flat=True))
@@ -1,3 +1,29 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
 
-# Create your tests here.
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create(email='student@example.com', username='student', full_name='Student')
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=user).key}'}
+
+    def logout_twice(self):
+        self.assertEqual(self.client.get('/api/inventory/', **self.auth).status_code, 200)
+        self.assertEqual(self.client.post('/api/logout/', **self.auth).status_code, 204)
+        # the token is gone: protected views refuse it, public ones treat the caller as anonymous
+        self.assertEqual(self.client.post('/api/logout/', **self.auth).status_code, 401)
+        self.assertEqual(self.client.get('/api/inventory/', **self.auth).status_code, 200)
+
+    def test_logout_revokes_token(self):
+        self.logout_twice()
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=60)
+    def test_logout_revokes_cached_token(self):
+        self.logout_twice()
+
+    def test_unknown_token_is_anonymous_on_public_endpoints(self):
+        response = self.client.get('/api/inventory/', HTTP_AUTHORIZATION='Token not-a-real-token')
+        self.assertEqual(response.status_code, 200)
@@ -1,7 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import serializers, status
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from accounts.models import User
@@ -125,4 +125,18 @@ class LoginView(APIView):
             'id_number': getattr(user, 'id_number', '') or '',
             'is_student': user.is_student,
             'role': 'Student' if user.is_student else 'Teacher'
-        })
\ No newline at end of file
+        })
+
+
+class LogoutView(APIView):
+    """Invalidate the token sent with the request.
+
+    POST /api/logout/  (Authorization: Token <key>)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if request.auth is not None:
+            # queryset delete still sends post_delete, which drops the cached lookup
+            Token.objects.filter(key=request.auth.key).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -3,7 +3,7 @@ from django.contrib import admin
 from .models import InventoryItem
 
 from .models import UserReview
-from .models import BorrowRequest, BorrowRequestItem
+from .models import BorrowRequest, BorrowRequestItem, InventorySyncOutbox, Job
 
 
 @admin.register(InventoryItem)
@@ -50,3 +50,17 @@ class BorrowRequestAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(InventorySyncOutbox)
+class InventorySyncOutboxAdmin(admin.ModelAdmin):
+    list_display = ('item', 'attempts', 'next_attempt_at', 'failed_at', 'created_at')
+    list_filter = (('failed_at', admin.EmptyFieldListFilter),)
+    readonly_fields = ('created_at',)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
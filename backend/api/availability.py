@@ -0,0 +1,213 @@
+"""Availability counters for inventory items.
+
+Each `InventoryItem` carries materialized counters of the units currently out
+on loan (`borrowed_units`, items with status 'borrowed') and of the units
+approved but not yet picked up (`reserved_units`, status 'approved'). Items are
+matched to `BorrowRequestItem` rows through `item_key`. A row whose key has no
+inventory item (unlinked, keyless or renamed since) cannot be counted, so any
+change that would start counting it is refused as a shortage with nothing
+available.
+
+Code that changes item statuses takes a `snapshot` of the affected rows before
+and after the change and passes both to `apply_counter_changes`, which updates
+all touched items with one F-expression UPDATE. Reads are plain column reads;
+`compute_counters` rebuilds the counters from scratch for reconciliation.
+
+Inventory rows are always locked in `item_key` order, all in one pass, so
+concurrent approvals and returns touching overlapping items cannot deadlock:
+callers lock every key of both snapshots up front (`lock_snapshots`) and hand
+the locked rows to `apply_counter_changes`, which then takes no locks of its
+own. `reserve_stock` does both and uses `find_shortages` on the locked rows to
+refuse handing out more units than `stock - borrowed_units - reserved_units`.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .conditional import bump_catalog_version
+from .models import BorrowRequestItem, InventoryItem
+
+
+BORROWED_STATUS = 'borrowed'
+RESERVED_STATUS = 'approved'
+
+# Item status -> counter column it contributes to
+COUNTER_FIELDS = {
+    BORROWED_STATUS: 'borrowed_units',
+    RESERVED_STATUS: 'reserved_units',
+}
+
+
+class InsufficientStock(Exception):
+    """Raised when a status change would hand out more units than are available."""
+
+    def __init__(self, shortages):
+        super().__init__('insufficient stock')
+        self.shortages = shortages
+
+
+def with_availability(queryset):
+    """Annotate an InventoryItem queryset with `active_borrowed` and `current_stock`."""
+    return queryset.annotate(
+        active_borrowed=F('borrowed_units'),
+        current_stock=F('stock') - F('borrowed_units'),
+    )
+
+
+def active_borrowed_for(item):
+    """Borrowed units for a single item, reusing the annotation when present."""
+    annotated = getattr(item, 'active_borrowed', None)
+    if annotated is not None:
+        return int(annotated)
+    return int(item.borrowed_units or 0)
+
+
+def snapshot(items):
+    """Counter contributions of BorrowRequestItem instances as `(item_key, status, quantity)`."""
+    return [(it.item_key, str(it.status).lower(), int(it.quantity or 0)) for it in items]
+
+
+def counted_items_q(prefix=''):
+    """Q matching BorrowRequestItem rows that contribute to a counter."""
+    q = Q()
+    for item_status in COUNTER_FIELDS:
+        q |= Q(**{f'{prefix}status__iexact': item_status})
+    return q
+
+
+def _tally(entries):
+    totals = defaultdict(lambda: defaultdict(int))
+    for item_key, item_status, quantity in entries:
+        field = COUNTER_FIELDS.get(item_status)
+        if field:
+            totals[item_key or ''][field] += quantity
+    return totals
+
+
+def counter_deltas(before, after):
+    """Return `{item_key: {field: delta}}` between two snapshots, omitting zeros."""
+    old = _tally(before)
+    new = _tally(after)
+    deltas = {}
+    for item_key in set(old) | set(new):
+        changed = {}
+        for field in COUNTER_FIELDS.values():
+            delta = new[item_key][field] - old[item_key][field]
+            if delta:
+                changed[field] = delta
+        if changed:
+            deltas[item_key] = changed
+    return deltas
+
+
+def lock_inventory(item_keys):
+    """Lock the InventoryItem rows for `item_keys` in key order and return `{item_key: item}`."""
+    keys = sorted({key for key in item_keys if key})
+    if not keys:
+        return {}
+    rows = (
+        InventoryItem.objects.select_for_update()
+        .filter(item_key__in=keys)
+        .order_by('item_key')
+        .only('id', 'item_key', 'stock', 'borrowed_units', 'reserved_units')
+    )
+    return {item.item_key: item for item in rows}
+
+
+def lock_snapshots(*snapshots):
+    """Lock the InventoryItem rows of every item_key in `snapshots` in one ordered pass."""
+    return lock_inventory(item_key for entries in snapshots for item_key, _, _ in entries)
+
+
+def available_units(item):
+    """Units neither on loan nor reserved."""
+    return int(item.stock or 0) - int(item.borrowed_units or 0) - int(item.reserved_units or 0)
+
+
+def net_demand(before, after):
+    """Additional units each item_key would need to move from `before` to `after`."""
+    demand = {}
+    for item_key, changed in counter_deltas(before, after).items():
+        total = sum(changed.values())
+        if total > 0:
+            demand[item_key] = total
+    return demand
+
+
+def find_shortages(demand, locked):
+    """Compare `demand` with locked rows; keys without an inventory row have nothing available."""
+    shortages = []
+    for item_key in sorted(demand):
+        item = locked.get(item_key)
+        available = available_units(item) if item is not None else 0
+        if demand[item_key] > available:
+            shortages.append({'item_key': item_key, 'requested': demand[item_key], 'available': max(available, 0)})
+    return shortages
+
+
+def reserve_stock(before, after):
+    """Lock the rows touched by moving from `before` to `after` and check the stock.
+
+    Raises `InsufficientStock` when the move needs more units than are
+    available; otherwise returns the locked rows for `apply_counter_changes`.
+    """
+    locked = lock_snapshots(before, after)
+    shortages = find_shortages(net_demand(before, after), locked)
+    if shortages:
+        raise InsufficientStock(shortages)
+    return locked
+
+
+def apply_counter_changes(before, after, locked=None):
+    """Move the counters of every affected item from `before` to `after` in one UPDATE.
+
+    Touched items also get a fresh `updated_at` and the catalog version is
+    bumped, so ETags and delta sync pick up the availability change. Call inside the transaction that changed the
+    BorrowRequestItem rows. Pass `locked` when the rows were already locked
+    with `lock_snapshots`/`reserve_stock`; otherwise they are locked here.
+    """
+    deltas = counter_deltas(before, after)
+    # Keyless rows have no inventory item to count against
+    deltas.pop('', None)
+    if not deltas:
+        return 0
+    if locked is None:
+        # Take the row locks in key order before the UPDATE locks them in scan order
+        lock_inventory(deltas)
+    updates = {}
+    for field in COUNTER_FIELDS.values():
+        whens = [
+            When(item_key=item_key, then=F(field) + Value(changed[field]))
+            for item_key, changed in deltas.items()
+            if field in changed
+        ]
+        if whens:
+            updates[field] = Case(*whens, default=F(field), output_field=IntegerField())
+    updated = InventoryItem.objects.filter(item_key__in=list(deltas)).update(updated_at=timezone.now(), **updates)
+    if updated:
+        bump_catalog_version()
+    return updated
+
+
+def compute_counters(item_keys=None):
+    """Recompute counters from BorrowRequestItem rows with one grouped query.
+
+    Returns `{item_key: {'borrowed_units': n, 'reserved_units': n}}`; keys
+    with nothing borrowed or reserved are absent.
+    """
+    qs = BorrowRequestItem.objects.filter(counted_items_q())
+    if item_keys is not None:
+        qs = qs.filter(item_key__in=list(item_keys))
+    rows = (
+        qs.order_by()
+        .annotate(status_lower=Lower('status'))
+        .values('item_key', 'status_lower')
+        .annotate(total=Sum('quantity'))
+    )
+    totals = {}
+    for row in rows:
+        field = COUNTER_FIELDS[row['status_lower']]
+        totals.setdefault(row['item_key'], {f: 0 for f in COUNTER_FIELDS.values()})[field] += row['total'] or 0
+    return totals
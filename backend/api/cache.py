@@ -0,0 +1,81 @@
+"""Server-side cache for inventory catalog reads.
+
+Serialized catalog data (list pages and single items) is stored under keys
+that embed the ETag of the data it was built from. ETags come from the
+database on every request (`api.conditional`: the catalog version, or the
+item's own columns), so a write from any process, web worker, job worker or
+management command, moves readers to fresh keys as soon as it commits; old
+entries simply expire. Nothing has to be invalidated and the validators
+themselves are never cached. Every write path that changes a catalog
+response, including queryset `update()`s and bulk writes, sets `updated_at`
+and calls `bump_catalog_version` in its transaction.
+
+A reader takes the validators before building the data, so a write that
+commits in between can only put newer data under an older key, never older
+data under a newer one.
+
+With the default local memory backend each process fills its own cache;
+a shared backend (CACHE_BACKEND=file or redis) only raises the hit ratio.
+
+Hit and miss counts per namespace are kept in the cache too, so they are
+shared by all workers when a shared backend is configured; `cache_stats`
+reads them for /api/cache/stats/.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+STATS_KEY = 'cache-stats:{namespace}:{outcome}'
+NAMESPACES = ('catalog-list', 'catalog-item')
+
+_MISSING = object()
+
+
+def _count(namespace, outcome):
+    key = STATS_KEY.format(namespace=namespace, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cached(namespace, parts, compute, timeout=None):
+    """Return the cached value for `(namespace, parts)` or compute and store it.
+
+    `parts` are joined into the key (hashed) and must include the ETag of
+    the data `compute` reads, so entries go stale as soon as it changes.
+    """
+    digest = hashlib.md5('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    key = f'{namespace}:{digest}'
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(namespace, 'hit')
+        return value
+    _count(namespace, 'miss')
+    value = compute()
+    cache.set(key, value, timeout if timeout is not None else settings.CATALOG_CACHE_TIMEOUT)
+    return value
+
+
+def cache_stats():
+    """`{namespace: {hits, misses, hit_ratio}}` for every catalog namespace."""
+    keys = [
+        STATS_KEY.format(namespace=namespace, outcome=outcome)
+        for namespace in NAMESPACES
+        for outcome in ('hit', 'miss')
+    ]
+    values = cache.get_many(keys)
+    stats = {}
+    for namespace in NAMESPACES:
+        hits = values.get(STATS_KEY.format(namespace=namespace, outcome='hit'), 0)
+        misses = values.get(STATS_KEY.format(namespace=namespace, outcome='miss'), 0)
+        total = hits + misses
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+    return stats
@@ -0,0 +1,56 @@
+"""Server-side filtering and search for the inventory catalog list.
+
+`filter_catalog` applies the optional `category`, `cabinet`, `type`,
+`in_stock` and `search` query parameters. The equality filters accept
+comma-separated values and are served by the `(category, name)`-style
+B-tree indexes, which also keep the default name ordering cheap.
+
+`search` matches every whitespace-separated term against `name`,
+`description` or `use` with a case-insensitive substring match. On Postgres
+the 0012 migration adds pg_trgm GIN indexes on `UPPER(col::text)`, the exact
+expression Django's `icontains` produces, so the match is an index lookup;
+other databases fall back to a LIKE scan of the (already filtered) rows.
+"""
+from django.db.models import Q
+
+
+SEARCH_FIELDS = ('name', 'description', 'use')
+EQUALITY_FILTERS = ('category', 'cabinet', 'type')
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def search_q(text, fields=SEARCH_FIELDS):
+    """Q requiring each term of `text` to appear in at least one of `fields`."""
+    q = Q()
+    for term in text.split():
+        term_q = Q()
+        for field in fields:
+            term_q |= Q(**{f'{field}__icontains': term})
+        q &= term_q
+    return q
+
+
+def filter_catalog(queryset, params):
+    """Apply the catalog query parameters to an availability-annotated queryset."""
+    for field in EQUALITY_FILTERS:
+        raw = params.get(field)
+        if not raw:
+            continue
+        values = [v.strip() for v in raw.split(',') if v.strip()]
+        if len(values) == 1:
+            queryset = queryset.filter(**{field: values[0]})
+        elif values:
+            queryset = queryset.filter(**{f'{field}__in': values})
+
+    in_stock = str(params.get('in_stock', '')).lower()
+    if in_stock in TRUE_VALUES:
+        queryset = queryset.filter(current_stock__gt=0)
+    elif in_stock in FALSE_VALUES:
+        queryset = queryset.filter(current_stock__lte=0)
+
+    search = (params.get('search') or params.get('q') or '').strip()
+    if search:
+        queryset = queryset.filter(search_q(search))
+    return queryset
@@ -0,0 +1,53 @@
+"""Validators for conditional GETs on the inventory catalog.
+
+The catalog ETag is backed by the single `CatalogVersion` row, which every
+inventory write bumps with `bump_catalog_version` inside its own transaction.
+The bump's row lock is held until commit, so the version a reader sees moves
+exactly when the write becomes visible; a fingerprint such as the row count
+and `max(updated_at)` can miss a write whose timestamp was taken before a
+later one that committed first. Reading the version is a primary key lookup,
+far cheaper than loading and serializing the catalog.
+
+Writers bump the version after their inventory rows are written, i.e. after
+locking them, so the version row is always the last lock taken.
+"""
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion
+
+
+def _etag(*parts):
+    digest = hashlib.md5('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def bump_catalog_version():
+    """Advance the catalog version; call in the transaction that changed inventory rows."""
+    changes = {'version': F('version') + 1, 'changed_at': timezone.now()}
+    if not CatalogVersion.objects.filter(pk=1).update(**changes):
+        # The migration creates the row; recreate it if it was removed
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+def catalog_validators(variant=''):
+    """Return `(etag, last_modified)` for the whole inventory catalog.
+
+    `variant` (e.g. the query string) distinguishes filtered or paginated
+    views of the same catalog state.
+    """
+    current = CatalogVersion.objects.filter(pk=1).values('version', 'changed_at').first()
+    if current is None:
+        current = {'version': 0, 'changed_at': None}
+    # changed_at keeps the ETag unique if a version number is ever reused,
+    # e.g. after restoring a backup
+    etag = _etag('catalog', current['version'], current['changed_at'], variant)
+    return etag, current['changed_at']
+
+
+def item_validators(item):
+    """Return `(etag, last_modified)` for a single item."""
+    etag = _etag('item', item.pk, item.updated_at, item.stock, item.borrowed_units, item.reserved_units)
+    return etag, item.updated_at
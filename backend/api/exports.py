@@ -0,0 +1,208 @@
+"""Spreadsheet export helpers.
+
+Exports are written with openpyxl's write-only workbook, which serialises rows
+as they are appended instead of keeping the whole sheet in memory, into a
+temporary file that `FileResponse` then sends in chunks. Peak memory stays
+flat regardless of the row count, but the file is complete before the first
+byte goes out, so time to first byte grows with the report; large reports
+should use the `?async=true` job path instead. `manage.py bench_exports`
+measures both.
+"""
+import tempfile
+from datetime import datetime
+
+from django.db.models import Prefetch
+from django.http import FileResponse
+from openpyxl import Workbook
+
+from .models import BorrowRequestItem
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Rows fetched from the database per round trip when iterating querysets
+EXPORT_CHUNK_SIZE = 2000
+
+INVENTORY_HEADERS = [
+    'id',
+    'item_key',
+    'name',
+    'category',
+    'type',
+    'use',
+    'cabinet',
+    'stock',
+    'active_borrowed',
+    'current_stock',
+    'description',
+]
+
+BORROWER_HEADERS = [
+    'Request ID',
+    'Date Requested',
+    'Student Name',
+    'Student ID',
+    'Email',
+    'Teacher Name',
+    'Item Name',
+    'Quantity',
+    'Purpose',
+    'Borrow Date',
+    'Return Date',
+    'Actual Return Date',
+    'Status',
+    'Admin Remark',
+]
+
+
+def write_xlsx(fileobj, title, headers, rows):
+    """Write `headers` followed by every row from the `rows` iterable to `fileobj`."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    ws.append(headers)
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
+
+
+def xlsx_response(filename, title, headers, rows):
+    """Build the whole workbook in a temporary file, then send it as an attachment.
+
+    Nothing is sent until every row has been written (see the module docstring).
+    """
+    tmp = tempfile.TemporaryFile()
+    try:
+        write_xlsx(tmp, title, headers, rows)
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    # FileResponse reads the file in blocks and closes it once sent
+    return FileResponse(tmp, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def filter_borrower_requests(queryset, params):
+    """Apply the borrower report's `from_date`, `to_date`, `status` and `student_id` filters.
+
+    Malformed dates are ignored.
+    """
+    from_date = params.get('from_date', None)
+    to_date = params.get('to_date', None)
+    status_filter = params.get('status', None)
+    student_id_filter = params.get('student_id', None)
+
+    if from_date:
+        try:
+            from_dt = datetime.strptime(from_date, '%Y-%m-%d').date()
+            queryset = queryset.filter(created_at__date__gte=from_dt)
+        except ValueError:
+            pass
+
+    if to_date:
+        try:
+            to_dt = datetime.strptime(to_date, '%Y-%m-%d').date()
+            queryset = queryset.filter(created_at__date__lte=to_dt)
+        except ValueError:
+            pass
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    if student_id_filter:
+        queryset = queryset.filter(student_id=student_id_filter)
+    return queryset
+
+
+def borrower_report_filename(params):
+    """File name of the borrower report, including the date range if provided."""
+    from_date = params.get('from_date', None)
+    to_date = params.get('to_date', None)
+    filename = 'borrower_report'
+    if from_date and to_date:
+        filename += f'_{from_date}_to_{to_date}'
+    elif from_date:
+        filename += f'_from_{from_date}'
+    elif to_date:
+        filename += f'_to_{to_date}'
+    return filename + '.xlsx'
+
+
+def inventory_rows(queryset):
+    """Yield export rows for an InventoryItem queryset annotated by `with_availability`."""
+    for it in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Borrowed units come from the `with_availability` annotation
+        active_borrowed = int(it.active_borrowed or 0)
+        try:
+            stock_val = int(getattr(it, 'stock', 0) or 0)
+        except Exception:
+            stock_val = 0
+        current_stock = stock_val - active_borrowed
+
+        yield [
+            getattr(it, 'id', ''),
+            getattr(it, 'item_key', ''),
+            getattr(it, 'name', ''),
+            getattr(it, 'category', ''),
+            getattr(it, 'type', ''),
+            getattr(it, 'use', ''),
+            getattr(it, 'cabinet', ''),
+            stock_val,
+            active_borrowed,
+            current_stock,
+            getattr(it, 'description', ''),
+        ]
+
+
+def borrower_rows(queryset):
+    """Yield one report row per borrowed item (or per request without items).
+
+    Items are prefetched once per chunk of requests, so the export costs two
+    queries per EXPORT_CHUNK_SIZE requests instead of two per request.
+    """
+    queryset = queryset.prefetch_related(
+        Prefetch('items', queryset=BorrowRequestItem.objects.order_by('id'))
+    )
+    for req in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Items come from the prefetch cache; no per-request query
+        items = list(req.items.all())
+
+        if items:
+            for item in items:
+                actual_return_date = ''
+                if hasattr(item, 'actual_returned_at') and item.actual_returned_at:
+                    actual_return_date = item.actual_returned_at.strftime('%Y-%m-%d %H:%M:%S')
+
+                yield [
+                    req.request_id,
+                    req.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                    req.student_name,
+                    req.student_id,
+                    req.email,
+                    req.teacher_name,
+                    item.item_name,
+                    item.quantity,
+                    req.purpose,
+                    req.borrow_date.strftime('%Y-%m-%d') if req.borrow_date else '',
+                    req.return_date.strftime('%Y-%m-%d') if req.return_date else '',
+                    actual_return_date,
+                    item.status,
+                    item.admin_remark or req.admin_remark or '',
+                ]
+        else:
+            # If no items, still show the request
+            yield [
+                req.request_id,
+                req.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                req.student_name,
+                req.student_id,
+                req.email,
+                req.teacher_name,
+                '',
+                0,
+                req.purpose,
+                req.borrow_date.strftime('%Y-%m-%d') if req.borrow_date else '',
+                req.return_date.strftime('%Y-%m-%d') if req.return_date else '',
+                '',
+                req.status,
+                req.admin_remark or '',
+            ]
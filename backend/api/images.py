@@ -0,0 +1,215 @@
+"""Resized image variants for inventory and review photos.
+
+Each uploaded image gets a `thumb`, `card` and `full` variant, each stored as
+JPEG and WebP next to the original under `variants/`. The model keeps the
+original's pixel size in `image_width`/`image_height` and a description of the
+variants in `image_variants`:
+
+    {"source": "inventory_images/x.jpg",
+     "thumb": {"width": 160, "height": 120, "jpeg": "variants/...", "webp": "variants/..."},
+     ...}
+
+`source` records which upload the variants were made from, so a replaced
+image is detected and reprocessed. Uploads are processed after the saving
+transaction commits, on a small thread pool (Pillow releases the GIL while
+decoding and resizing), so requests never wait for resizing. Set
+`IMAGE_VARIANT_WORKERS = 0` to process inline. Existing images are handled by
+`manage.py generate_image_variants`.
+
+`media_url_builder` turns stored file names into absolute URLs for a request.
+With the filesystem storage the absolute media base is derived once and file
+names are appended to it, instead of re-running `storage.url()` and
+`request.build_absolute_uri()` for every image of every row.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps
+
+from .conditional import bump_catalog_version
+from .models import InventoryItem
+
+
+logger = logging.getLogger(__name__)
+
+# name -> bounding box; images are scaled down to fit, never up
+VARIANT_SIZES = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'full': (1600, 1600),
+}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def needs_variants(instance):
+    """True when the instance has an image whose variants are missing or stale."""
+    if not instance.image:
+        return False
+    return (instance.image_variants or {}).get('source') != instance.image.name
+
+
+def _variant_base(source_name):
+    directory, filename = os.path.split(source_name)
+    stem, _ext = os.path.splitext(filename)
+    return f'variants/{directory}/{stem}' if directory else f'variants/{stem}'
+
+
+def _encode(image, fmt, quality):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.save(buffer, fmt, quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, fmt, quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def build_variants(source_name, storage=None):
+    """Render every variant of the stored image `source_name`.
+
+    Returns `(width, height, variants)` ready to be saved on the model.
+    """
+    storage = storage or default_storage
+    with storage.open(source_name, 'rb') as fh:
+        with Image.open(fh) as opened:
+            original = ImageOps.exif_transpose(opened)
+            width, height = original.size
+            if original.mode not in ('RGB', 'L'):
+                # flatten transparency onto white for JPEG
+                rgba = original.convert('RGBA')
+                original = Image.new('RGB', rgba.size, (255, 255, 255))
+                original.paste(rgba, mask=rgba.getchannel('A'))
+            elif original.mode == 'L':
+                original = original.convert('RGB')
+            else:
+                original.load()
+
+    base = _variant_base(source_name)
+    variants = {'source': source_name}
+    for name, box in VARIANT_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail(box, Image.Resampling.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for fmt, ext, quality in (('JPEG', 'jpg', JPEG_QUALITY), ('WEBP', 'webp', WEBP_QUALITY)):
+            path = f'{base}_{name}.{ext}'
+            if storage.exists(path):
+                storage.delete(path)
+            entry['jpeg' if ext == 'jpg' else 'webp'] = storage.save(path, ContentFile(_encode(resized, fmt, quality)))
+        variants[name] = entry
+    return width, height, variants
+
+
+def process_instance(model, pk, force=False):
+    """Generate and record variants for one row. Returns True if variants were written."""
+    instance = model.objects.filter(pk=pk).only('pk', 'image', 'image_variants').first()
+    if instance is None or not instance.image or not (force or needs_variants(instance)):
+        return False
+    source_name = instance.image.name
+    try:
+        width, height, variants = build_variants(source_name)
+    except Exception as exc:
+        logger.warning('Image variants for %s %s failed: %s', model.__name__, pk, exc)
+        return False
+    changes = {'image_width': width, 'image_height': height, 'image_variants': variants}
+    if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+        # so ETags and delta sync pick up the new variants
+        changes['updated_at'] = timezone.now()
+    with transaction.atomic():
+        # Only record the result if the image was not replaced meanwhile
+        written = bool(model.objects.filter(pk=pk, image=source_name).update(**changes))
+        if written and model is InventoryItem:
+            bump_catalog_version()
+    return written
+
+
+def process_in_worker(model, pk, force=False):
+    """`process_instance` for pool threads, which own their DB connections."""
+    close_old_connections()
+    try:
+        return process_instance(model, pk, force=force)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-variants')
+    return _executor
+
+
+def schedule_variants(instance):
+    """Queue variant generation for `instance` once the current transaction commits."""
+    model, pk = type(instance), instance.pk
+
+    def submit():
+        if getattr(settings, 'IMAGE_VARIANT_WORKERS', 2) <= 0:
+            process_instance(model, pk)
+        else:
+            _get_executor().submit(process_in_worker, model, pk)
+
+    transaction.on_commit(submit)
+
+
+def media_url_builder(request=None, storage=None):
+    """Return `url_for(name)` giving the (absolute, when `request` is set) URL of a stored file.
+
+    The builder is cached on the request, so every serializer rendering
+    during one request shares it.
+    """
+    if request is not None:
+        cached = getattr(request, '_media_url_for', None)
+        if cached is not None and storage is None:
+            return cached
+    storage = storage or default_storage
+    if isinstance(storage, FileSystemStorage):
+        base = storage.base_url
+        if request is not None:
+            base = request.build_absolute_uri(base)
+
+        def url_for(name):
+            # Same result as FileSystemStorage.url() + build_absolute_uri()
+            return base + filepath_to_uri(name).lstrip('/')
+    elif request is not None:
+        def url_for(name):
+            return request.build_absolute_uri(storage.url(name))
+    else:
+        url_for = storage.url
+
+    if request is not None and storage is default_storage:
+        request._media_url_for = url_for
+    return url_for
+
+
+def variant_urls(instance, request=None, url_for=None):
+    """Serializer representation of `image_variants` with (absolute) URLs."""
+    url_for = url_for or media_url_builder(request)
+    variants = instance.image_variants or {}
+    if not instance.image or variants.get('source') != instance.image.name:
+        return None
+    data = {}
+    for name in VARIANT_SIZES:
+        entry = variants.get(name)
+        if not entry:
+            continue
+        data[name] = {
+            'width': entry['width'],
+            'height': entry['height'],
+            'jpeg': url_for(entry['jpeg']),
+            'webp': url_for(entry['webp']),
+        }
+    return data
@@ -0,0 +1,409 @@
+"""Bulk inventory import.
+
+`read_rows` turns a CSV, JSON, JSON Lines or XLSX file (or the frontend's
+`inventory_data.js`) into `(row_number, row)` pairs, and `import_rows`
+applies them in batches of `batch_size`:
+
+- each batch loads its existing items with one `item_key__in` query and diffs
+  them against the rows, so every row is a create, update, unchanged or skip;
+  invalid rows are reported with their errors instead of being written;
+- creates and updates are written with `bulk_create`/`bulk_update`, and what
+  the per-row signals would have done (search documents, linking earlier
+  requests and reviews, catalog cache, Supabase outbox, image variants) is
+  done once per batch;
+- images are stored under a name containing their content hash, so an
+  unchanged image is recognised without copying it; new ones are hashed and
+  copied on a thread pool.
+
+Readers are generators (CSV line by line, XLSX through openpyxl's read-only
+mode, JSON Lines one object per line), so memory is bounded by the batch size.
+Plain JSON and `inventory_data.js` are parsed whole. `import_rows` does not
+open a transaction; callers wrap it in `transaction.atomic()`.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .conditional import bump_catalog_version
+from .images import schedule_variants
+from .inventory_links import link_orphans_bulk
+from .models import InventoryItem
+from .search import index_instances
+from .supabase_sync import enqueue_item_ids
+
+
+DEFAULT_BATCH_SIZE = 500
+FORMATS = ('csv', 'json', 'jsonl', 'xlsx', 'js')
+
+# Text columns and their maximum length (None: unlimited)
+TEXT_FIELDS = {
+    'name': 255,
+    'category': 100,
+    'cabinet': 100,
+    'type': 100,
+    'use': 255,
+    'description': None,
+}
+ITEM_KEY_MAX_LENGTH = 100
+IMAGE_DIR = 'inventory_images'
+
+_HASH_CHUNK = 1024 * 1024
+
+
+class ImportFormatError(ValueError):
+    """Raised when a source file cannot be read as the requested format."""
+
+
+class ImportReport:
+    """Outcome of `import_rows`: counts, per-row errors and (optionally) the diff."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = []
+        self.warnings = []
+        self.changes = []
+
+    def discard(self):
+        """Zero the write counts after the caller rolled the import back."""
+        self.created = self.updated = self.unchanged = 0
+        self.changes = []
+
+    def add_error(self, row_number, item_key, errors):
+        self.errors.append({'row': row_number, 'item_key': item_key or None, 'errors': list(errors)})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'warnings': self.warnings,
+        }
+
+
+@lru_cache(maxsize=256)
+def normalize_header(header):
+    """`itemKey`, `Item Key` and `item_key` all become `item_key`."""
+    text = re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', str(header or '').strip())
+    return re.sub(r'[\s\-]+', '_', text).lower()
+
+
+def detect_format(name):
+    ext = os.path.splitext(name or '')[1].lower().lstrip('.')
+    if ext == 'ndjson':
+        ext = 'jsonl'
+    if ext not in FORMATS:
+        raise ImportFormatError(f'unsupported file type: {name} (expected one of {", ".join(FORMATS)})')
+    return ext
+
+
+def _read_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(f'not UTF-8 text: {exc}')
+    except csv.Error as exc:
+        raise ImportFormatError(f'not a readable CSV file (line {reader.line_num}): {exc}')
+
+
+def _read_xlsx(fileobj):
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:
+        raise ImportFormatError(f'not a readable xlsx workbook: {exc}')
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, None)
+        if not headers:
+            return
+        headers = [str(h).strip() if h is not None else '' for h in headers]
+        for row_number, values in enumerate(rows, start=2):
+            if all(v is None or str(v).strip() == '' for v in values):
+                continue
+            yield row_number, {h: v for h, v in zip(headers, values) if h}
+    finally:
+        wb.close()
+
+
+def _read_json(fileobj):
+    try:
+        data = json.load(fileobj)
+    except ValueError as exc:
+        raise ImportFormatError(f'invalid JSON: {exc}')
+    if isinstance(data, dict):
+        data = data.get('items', data.get('inventory'))
+    if not isinstance(data, list):
+        raise ImportFormatError('JSON must be a list of items or an object with an "items" list')
+    for index, entry in enumerate(data, start=1):
+        yield index, entry if isinstance(entry, dict) else {}
+
+
+def _read_jsonl(fileobj):
+    for line_number, line in enumerate(io.TextIOWrapper(fileobj, encoding='utf-8'), start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        yield line_number, entry if isinstance(entry, dict) else {'__invalid__': True}
+
+
+def _read_js(fileobj):
+    """Entries of `const DEFAULT_INVENTORY = [...]` in the frontend's inventory_data.js."""
+    text = fileobj.read().decode('utf-8')
+    # Extract the array literal assigned to DEFAULT_INVENTORY
+    m = re.search(r"const\s+DEFAULT_INVENTORY\s*=\s*(\[[\s\S]*?\])\s*;", text, re.M)
+    if not m:
+        raise ImportFormatError('failed to locate DEFAULT_INVENTORY')
+    arr_text = m.group(1)
+    # Remove JS comments (block and single-line)
+    arr_text = re.sub(r'/\*[\s\S]*?\*/', '', arr_text)
+    arr_text = re.sub(r'//.*', '', arr_text)
+    # Convert single-quoted JS strings to double-quoted JSON strings (handles escaped chars)
+    arr_text = re.sub(r"'((?:\\.|[^'\\])*)'", r'"\1"', arr_text)
+    # Quote unquoted object keys (e.g. itemKey: -> "itemKey":)
+    arr_text = re.sub(r'([\{,\[]\s*)([A-Za-z_][A-Za-z0-9_]*)\s*:', r'\1"\2":', arr_text)
+    # Remove trailing commas before } or ]
+    arr_text = re.sub(r',\s*([}\]])', r'\1', arr_text)
+    # Replace JS-style escaped single-quotes (e.g. Ohm\'s) which are invalid JSON escapes
+    arr_text = arr_text.replace("\\'", "'")
+    return _read_json(io.BytesIO(arr_text.encode('utf-8')))
+
+
+_READERS = {
+    'csv': _read_csv,
+    'json': _read_json,
+    'jsonl': _read_jsonl,
+    'xlsx': _read_xlsx,
+    'js': _read_js,
+}
+
+
+def read_rows(fileobj, fmt):
+    """Yield `(row_number, row)` from a binary file object in format `fmt`."""
+    yield from _READERS[fmt](fileobj)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError
+        return int(value)
+    return int(str(value).strip())
+
+
+def clean_row(raw):
+    """Validate one source row.
+
+    Returns `(item_key, values, errors)`. `values` only holds the columns the
+    row provides, so updates leave absent columns untouched; a blank `stock`
+    cell also means "unchanged". Computed export columns (`id`,
+    `active_borrowed`, `current_stock`) are ignored.
+    """
+    if raw.get('__invalid__'):
+        return '', {}, ['not a JSON object']
+    row = {normalize_header(k): v for k, v in raw.items() if k is not None}
+    errors = []
+    item_key = _text(row.get('item_key'))
+    if not item_key:
+        errors.append('item_key is required')
+    elif len(item_key) > ITEM_KEY_MAX_LENGTH:
+        errors.append(f'item_key is longer than {ITEM_KEY_MAX_LENGTH} characters')
+
+    values = {}
+    for field, max_length in TEXT_FIELDS.items():
+        if field not in row:
+            continue
+        value = _text(row[field])
+        if max_length and len(value) > max_length:
+            errors.append(f'{field} is longer than {max_length} characters')
+        values[field] = value
+    if 'name' in values and not values['name']:
+        errors.append('name must not be blank')
+
+    if _text(row.get('stock')):
+        try:
+            stock = _integer(row['stock'])
+        except (TypeError, ValueError):
+            errors.append('stock must be a whole number')
+        else:
+            if stock < 0:
+                errors.append('stock must not be negative')
+            values['stock'] = stock
+
+    if _text(row.get('image')):
+        values['image'] = _text(row['image'])
+    return item_key, values, errors
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_name(path, digest):
+    """Storage name of an image: the source file name plus a content hash."""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f'{IMAGE_DIR}/{stem}-{digest[:12]}{ext.lower()}'
+
+
+def _store_image(path, name):
+    if default_storage.exists(name):
+        return name
+    with open(path, 'rb') as fh:
+        return default_storage.save(name, File(fh))
+
+
+def _resolve_images(batch, image_root, pool, report):
+    """Map item_key -> `(source_path, storage_name)` for rows with a usable image."""
+    found = []
+    for row_number, item_key, values in batch:
+        relative = values.pop('image', None)
+        if not relative or image_root is None:
+            continue
+        path = os.path.normpath(os.path.join(image_root, relative))
+        if os.path.isfile(path):
+            found.append((item_key, path))
+        else:
+            report.warnings.append({'row': row_number, 'item_key': item_key, 'message': f'image not found: {path}'})
+    digests = pool.map(_hash_file, [path for _key, path in found])
+    return {key: (path, image_name(path, digest)) for (key, path), digest in zip(found, digests)}
+
+
+def _apply_batch(batch, report, pool, overwrite, dry_run, image_root, collect_changes):
+    existing = {item.item_key: item for item in InventoryItem.objects.filter(item_key__in=[k for _r, k, _v in batch])}
+    images = _resolve_images(batch, image_root, pool, report)
+
+    to_create = []
+    to_update = []
+    update_fields = set()
+    copies = []
+    for row_number, item_key, values in batch:
+        item = existing.get(item_key)
+        image = images.get(item_key)
+        if item is None:
+            if not values.get('name'):
+                report.add_error(row_number, item_key, ['name is required for new items'])
+                continue
+            item = InventoryItem(item_key=item_key, **values)
+            to_create.append(item)
+            report.created += 1
+            diff = {field: [None, value] for field, value in values.items()}
+            if image:
+                copies.append((item, image))
+                diff['image'] = [None, image[1]]
+            if collect_changes:
+                report.changes.append({'row': row_number, 'item_key': item_key, 'action': 'create', 'fields': diff})
+            continue
+        if not overwrite:
+            report.skipped += 1
+            continue
+
+        diff = {field: [getattr(item, field), value] for field, value in values.items() if getattr(item, field) != value}
+        if image and item.image.name != image[1]:
+            diff['image'] = [item.image.name or None, image[1]]
+            copies.append((item, image))
+        if not diff:
+            report.unchanged += 1
+            continue
+        for field, (_old, new) in diff.items():
+            if field != 'image':
+                setattr(item, field, new)
+        update_fields.update(diff)
+        to_update.append(item)
+        report.updated += 1
+        if collect_changes:
+            report.changes.append({'row': row_number, 'item_key': item_key, 'action': 'update', 'fields': diff})
+
+    if dry_run or not (to_create or to_update):
+        return
+
+    stored = pool.map(lambda copy: _store_image(*copy[1]), copies)
+    for (item, _image), name in zip(copies, stored):
+        item.image = name
+
+    if to_create:
+        InventoryItem.objects.bulk_create(to_create)
+        if any(item.pk is None for item in to_create):
+            ids = dict(
+                InventoryItem.objects.filter(item_key__in=[item.item_key for item in to_create])
+                .values_list('item_key', 'id')
+            )
+            for item in to_create:
+                item.pk = ids.get(item.item_key)
+        link_orphans_bulk(to_create)
+    if to_update:
+        now = timezone.now()
+        for item in to_update:
+            item.updated_at = now
+        InventoryItem.objects.bulk_update(to_update, sorted(update_fields | {'updated_at'}))
+
+    bump_catalog_version()
+    written = to_create + to_update
+    index_instances(written)
+    enqueue_item_ids([item.pk for item in written])
+    for item, _image in copies:
+        schedule_variants(item)
+
+
+def import_rows(rows, overwrite=True, dry_run=False, batch_size=DEFAULT_BATCH_SIZE, image_root=None,
+                workers=4, collect_changes=False):
+    """Create or update InventoryItems from `(row_number, row)` pairs, matched by `item_key`.
+
+    Existing items are only changed with `overwrite` (otherwise counted as
+    skipped). `image` columns are resolved against `image_root` and ignored
+    when it is None. With `dry_run` nothing is written; `collect_changes`
+    records the per-row diff in `report.changes`.
+    """
+    report = ImportReport()
+    seen = {}
+    batch = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='inventory-import') as pool:
+        for row_number, raw in rows:
+            item_key, values, errors = clean_row(raw)
+            if not errors and item_key in seen:
+                errors = [f'duplicate item_key (first used on row {seen[item_key]})']
+            if errors:
+                report.add_error(row_number, item_key, errors)
+                continue
+            seen[item_key] = row_number
+            batch.append((row_number, item_key, values))
+            if len(batch) >= batch_size:
+                _apply_batch(batch, report, pool, overwrite, dry_run, image_root, collect_changes)
+                batch = []
+        if batch:
+            _apply_batch(batch, report, pool, overwrite, dry_run, image_root, collect_changes)
+    return report
@@ -0,0 +1,79 @@
+"""Linking borrow request items and reviews to their InventoryItem.
+
+Rows keep the denormalized `item_key`/`item_name` they were submitted with
+for history, and additionally point at the inventory row through the
+`inventory_item` foreign key. A row is matched by `item_key` first and then by
+a case-insensitive, unambiguous item name, the same rules the 0010 migration
+used to backfill existing data.
+"""
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+
+from .models import BorrowRequestItem, InventoryItem, UserReview
+
+
+def _normalize_name(name):
+    return (name or '').strip().lower()
+
+
+def link_inventory_items(rows):
+    """Set `inventory_item` on unsaved or unlinked `rows` with one query.
+
+    Rows that are already linked or match nothing are left alone. Returns the
+    rows that were linked; saving them is up to the caller.
+    """
+    pending = [row for row in rows if row.inventory_item_id is None]
+    keys = {row.item_key for row in pending if row.item_key}
+    names = {_normalize_name(row.item_name) for row in pending} - {''}
+    if not keys and not names:
+        return []
+
+    candidates = (
+        InventoryItem.objects
+        .annotate(name_lower=Lower('name'))
+        .filter(Q(item_key__in=keys) | Q(name_lower__in=names))
+        .values_list('pk', 'item_key', 'name_lower')
+    )
+    key_ids = {}
+    name_ids = {}
+    duplicate_names = set()
+    for pk, item_key, name_lower in candidates:
+        key_ids[item_key] = pk
+        name_lower = _normalize_name(name_lower)
+        if name_lower in name_ids:
+            duplicate_names.add(name_lower)
+        name_ids[name_lower] = pk
+    for name in duplicate_names:
+        name_ids.pop(name, None)
+
+    linked = []
+    for row in pending:
+        item_id = key_ids.get(row.item_key) or name_ids.get(_normalize_name(row.item_name))
+        if item_id:
+            row.inventory_item_id = item_id
+            linked.append(row)
+    return linked
+
+
+def link_orphans(item):
+    """Attach unlinked rows carrying `item`'s key, e.g. after the item is (re)created."""
+    linked = 0
+    for model in (BorrowRequestItem, UserReview):
+        linked += model.objects.filter(inventory_item__isnull=True, item_key=item.item_key).update(inventory_item=item)
+    return linked
+
+
+def link_orphans_bulk(items):
+    """`link_orphans` for many items with one UPDATE per model, e.g. after `bulk_create`."""
+    ids = {item.item_key: item.pk for item in items if item.pk is not None and item.item_key}
+    if not ids:
+        return 0
+    linked = 0
+    for model in (BorrowRequestItem, UserReview):
+        orphans = model.objects.filter(inventory_item__isnull=True, item_key__in=list(ids))
+        # Usually nothing matches; only build the CASE for keys that do
+        keys = set(orphans.order_by().values_list('item_key', flat=True).distinct())
+        if keys:
+            whens = [When(item_key=key, then=Value(ids[key])) for key in keys]
+            linked += orphans.update(inventory_item_id=Case(*whens, output_field=IntegerField()))
+    return linked
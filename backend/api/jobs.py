@@ -0,0 +1,241 @@
+"""Database-backed background jobs.
+
+Slow work (spreadsheet exports, bulk imports) can be queued instead of
+holding a web worker: the API calls `enqueue` and answers 202 with the job
+id, the client polls GET /api/jobs/{id}/ and downloads `artifact_url` once
+`status` is 'succeeded'.
+
+`manage.py run_worker` claims queued jobs with `SELECT ... FOR UPDATE SKIP
+LOCKED`, so several workers can share the table without a broker, and runs
+them on a process pool. A handler in `HANDLERS` takes the job's params and
+returns `(result, artifact)`, where `artifact` is `(filename, file)` or None;
+artifacts are saved to the default storage under `jobs/<id>/`. Claimed jobs
+hold a lease of JOB_LEASE_SECONDS that a heartbeat thread renews while the
+job runs; a job whose worker died is claimed again once the lease expires,
+up to MAX_ATTEMPTS times. `attempts` doubles as a fencing token: a run
+only records its outcome if the job was not claimed again meanwhile.
+"""
+import logging
+import tempfile
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .availability import with_availability
+from .exports import (
+    BORROWER_HEADERS, INVENTORY_HEADERS, borrower_report_filename, borrower_rows, filter_borrower_requests,
+    inventory_rows, write_xlsx,
+)
+from .inventory_import import ImportFormatError, import_rows, read_rows
+from .models import BorrowRequest, InventoryItem, Job
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+UPLOAD_DIR = 'job-uploads'
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job with a message and an optional result."""
+
+    def __init__(self, message, result=None):
+        super().__init__(message)
+        self.result = result or {}
+
+
+def _xlsx_artifact(filename, title, headers, rows):
+    tmp = tempfile.TemporaryFile()
+    write_xlsx(tmp, title, headers, rows)
+    tmp.seek(0)
+    return filename, tmp
+
+
+def _export_inventory(params):
+    qs = with_availability(InventoryItem.objects.all().order_by('name'))
+    return {}, _xlsx_artifact('inventory.xlsx', 'Inventory', INVENTORY_HEADERS, inventory_rows(qs))
+
+
+def _export_borrowers(params):
+    queryset = filter_borrower_requests(BorrowRequest.objects.all().order_by('-created_at'), params)
+    filename = borrower_report_filename(params)
+    return {}, _xlsx_artifact(filename, 'Borrower Report', BORROWER_HEADERS, borrower_rows(queryset))
+
+
+def _import_inventory(params):
+    try:
+        with default_storage.open(params['upload'], 'rb') as fh, transaction.atomic():
+            report = import_rows(read_rows(fh, params['format']), dry_run=params.get('dry_run', False))
+            if report.errors:
+                transaction.set_rollback(True)
+                report.discard()
+    except ImportFormatError as exc:
+        raise JobFailed(str(exc))
+    finally:
+        default_storage.delete(params['upload'])
+    result = {**report.as_dict(), 'dry_run': params.get('dry_run', False)}
+    if report.errors:
+        raise JobFailed('invalid rows; nothing was saved', result)
+    return result, None
+
+
+HANDLERS = {
+    'export_inventory': _export_inventory,
+    'export_borrowers': _export_borrowers,
+    'import_inventory': _import_inventory,
+}
+
+
+def enqueue(kind, params=None):
+    """Queue a job of `kind` (a key of HANDLERS) and return it."""
+    if kind not in HANDLERS:
+        raise ValueError(f'unknown job kind: {kind}')
+    return Job.objects.create(kind=kind, params=params or {})
+
+
+def store_upload(upload):
+    """Save an uploaded file for a job to read later; returns its storage name."""
+    return default_storage.save(f'{UPLOAD_DIR}/{upload.name}', upload)
+
+
+def job_lease():
+    return timedelta(seconds=settings.JOB_LEASE_SECONDS)
+
+
+def claim_jobs(limit, now=None):
+    """Lease up to `limit` runnable jobs and return their ids, oldest first.
+
+    Jobs that already used up their attempts are failed instead.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        due = (
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status='queued') | Q(status='running', lease_expires_at__lt=now))
+            .order_by('created_at')
+        )
+        claimed = []
+        exhausted = []
+        for job in due[:limit]:
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status = 'failed'
+                job.error = job.error or 'worker stopped before the job finished'
+                job.finished_at = now
+                exhausted.append(job)
+                continue
+            job.status = 'running'
+            job.attempts += 1
+            job.started_at = now
+            job.lease_expires_at = now + job_lease()
+            claimed.append(job)
+        Job.objects.bulk_update(claimed, ['status', 'attempts', 'started_at', 'lease_expires_at'])
+        Job.objects.bulk_update(exhausted, ['status', 'error', 'finished_at'])
+    return [job.pk for job in claimed]
+
+
+def renew_lease(job_id, attempt):
+    """Extend the lease of run `attempt` of a job; False once the job was claimed again."""
+    return bool(
+        Job.objects.filter(pk=job_id, status='running', attempts=attempt)
+        .update(lease_expires_at=timezone.now() + job_lease())
+    )
+
+
+@contextmanager
+def lease_heartbeat(job):
+    """Renew `job`'s lease from a background thread for as long as the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOB_LEASE_SECONDS / 3):
+                if not renew_lease(job.pk, job.attempts):
+                    logger.warning('Job %s lost its lease; its result will be discarded', job.pk)
+                    return
+        except Exception:
+            logger.exception('Lease heartbeat for job %s failed', job.pk)
+        finally:
+            # the thread's own connection
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-lease-{job.pk}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job_id):
+    """Run one claimed job in this process and record the outcome.
+
+    Returns the final status, or 'lost' when the lease expired and the job
+    was claimed again before this run finished; its outcome is then dropped.
+    """
+    job = Job.objects.get(pk=job_id)
+    handler = HANDLERS.get(job.kind)
+    artifact = None
+    try:
+        if handler is None:
+            raise JobFailed(f'unknown job kind: {job.kind}')
+        with lease_heartbeat(job):
+            job.result, artifact = handler(job.params)
+        if artifact is not None:
+            filename, fh = artifact
+            with fh:
+                job.artifact.save(filename, File(fh), save=False)
+        job.status = 'succeeded'
+        job.error = ''
+    except JobFailed as exc:
+        job.status = 'failed'
+        job.result = exc.result
+        job.error = str(exc)
+    except Exception:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        job.status = 'failed'
+        job.error = traceback.format_exc(limit=5)
+    recorded = Job.objects.filter(pk=job.pk, status='running', attempts=job.attempts).update(
+        status=job.status, result=job.result, artifact=job.artifact.name or '', error=job.error,
+        finished_at=timezone.now(), lease_expires_at=None,
+    )
+    if not recorded:
+        logger.warning('Job %s (%s) was claimed again while running; dropping this outcome', job.pk, job.kind)
+        if job.artifact:
+            job.artifact.delete(save=False)
+        return 'lost'
+    return job.status
+
+
+def run_in_worker(job_id):
+    """`run_job` for pool processes, which own their DB connections."""
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def purge_jobs(older_than):
+    """Delete finished jobs (and their artifacts) that finished before `older_than`."""
+    old = Job.objects.filter(status__in=['succeeded', 'failed'], finished_at__lt=older_than)
+    purged = 0
+    for job in old.iterator():
+        if job.artifact:
+            job.artifact.delete(save=False)
+        upload = job.params.get('upload')
+        if upload and default_storage.exists(upload):
+            # left behind when the job never ran to completion
+            default_storage.delete(upload)
+        job.delete()
+        purged += 1
+    return purged
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Count DB queries and time per token-authenticated request, uncached vs cached (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Authenticated requests per run')
+
+    def handle(self, *args, **options):
+        import time
+
+        from django.contrib.auth import get_user_model
+        from django.core.cache import cache
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext, override_settings
+        from rest_framework.authentication import TokenAuthentication
+        from rest_framework.authtoken.models import Token
+        from rest_framework.permissions import IsAuthenticated
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.views import APIView
+
+        from accounts.authentication import CachedTokenAuthentication, forget_tokens
+        from accounts.middleware import LastSeenMiddleware
+
+        total = max(1, options['requests'])
+        # a host from ALLOWED_HOSTS; the default 'testserver' is rejected outside tests
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+
+        class WhoAmI(APIView):
+            permission_classes = [IsAuthenticated]
+
+            def get(self, request):
+                return Response({'id': request.user.pk})
+
+        with transaction.atomic():
+            user = get_user_model().objects.create(
+                email='bench-auth@example.invalid', username='bench-auth', full_name='Auth Benchmark',
+            )
+            token = Token.objects.create(user=user)
+            try:
+                for label, auth_class in (('TokenAuthentication', TokenAuthentication),
+                                          ('CachedTokenAuthentication', CachedTokenAuthentication)):
+                    forget_tokens([token.key])
+                    cache.delete(f'last-seen:{user.pk}')
+                    handler = LastSeenMiddleware(WhoAmI.as_view(authentication_classes=[auth_class]))
+                    # measured with caching on, whatever the configured cache backend
+                    with override_settings(TOKEN_CACHE_TIMEOUT=60), CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        for _ in range(total):
+                            response = handler(factory.get('/bench/', HTTP_AUTHORIZATION=f'Token {token.key}'))
+                            assert response.status_code == 200, response.status_code
+                        elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{label:<28} {total:>6} requests  {len(queries) / total:6.3f} queries/request  '
+                        f'{elapsed / total * 1000:7.3f} ms/request'
+                    )
+            finally:
+                forget_tokens([token.key])
+                cache.delete(f'last-seen:{user.pk}')
+                transaction.set_rollback(True)
+
+        self.stdout.write('Auth benchmark finished')
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Count queries of the inventory export, list and detail as the catalog grows, against the old per-item export (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', default='100,1000,10000,50000', help='Comma-separated catalog sizes')
+        parser.add_argument('--legacy-limit', type=int, default=10000,
+                            help='Largest catalog size to also run the old one-query-per-item export on')
+
+    def handle(self, *args, **options):
+        from django.core.signals import request_finished
+        from django.db import close_old_connections, connection, transaction
+        from django.db.models import Sum
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIRequestFactory
+
+        from api.models import BorrowRequestItem, InventoryItem
+        from api.views import InventoryItemViewSet
+
+        # a host from ALLOWED_HOSTS; the default 'testserver' is rejected outside tests
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        sizes = sorted({int(part) for part in options['items'].split(',') if part.strip()})
+
+        def get(action, path, **kwargs):
+            response = InventoryItemViewSet.as_view({'get': action})(factory.get(path), **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            else:
+                response.render()
+            response.close()
+
+        def legacy_export():
+            # One aggregate per item, as export_xlsx did before the availability annotation
+            for it in InventoryItem.objects.all().order_by('name'):
+                BorrowRequestItem.objects.filter(
+                    item_key=it.item_key, status__iexact='borrowed',
+                ).aggregate(total=Sum('quantity'))
+
+        # Closing a response ends the "request", which would close the connection mid-transaction
+        request_finished.disconnect(close_old_connections)
+        with transaction.atomic():
+            try:
+                created = 0
+                for size in sizes:
+                    InventoryItem.objects.bulk_create([
+                        InventoryItem(item_key=f'bench-{n:06d}', name=f'Bench item {n}', stock=10, borrowed_units=n % 3)
+                        for n in range(created, size)
+                    ], batch_size=2000)
+                    created = max(created, size)
+                    first = InventoryItem.objects.order_by('pk').values_list('pk', flat=True).first()
+                    counts = []
+                    for label, call in (
+                        ('export_xlsx', lambda: get('export_xlsx', '/api/inventory/export_xlsx/')),
+                        ('list', lambda: get('list', '/api/inventory/?page_size=50')),
+                        ('detail', lambda: get('retrieve', f'/api/inventory/{first}/', id=first)),
+                        ('legacy export', legacy_export if size <= options['legacy_limit'] else None),
+                    ):
+                        if call is None:
+                            continue
+                        with CaptureQueriesContext(connection) as queries:
+                            call()
+                        counts.append(f'{label} {len(queries):>6} queries')
+                    self.stdout.write(f'{size:>7} items  ' + '  '.join(counts))
+            finally:
+                transaction.set_rollback(True)
+                request_finished.connect(close_old_connections)
+
+        self.stdout.write('Availability benchmark finished')
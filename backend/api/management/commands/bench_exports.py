@@ -0,0 +1,125 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Peak RSS and time to first byte of the borrower XLSX export, streamed vs in-memory (changes are rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='10000,100000',
+                            help='Comma-separated report sizes, e.g. 10000,100000,500000')
+
+    def handle(self, *args, **options):
+        import datetime
+        import io
+        import os
+        import threading
+        import time
+
+        from django.core.signals import request_finished
+        from django.db import close_old_connections, transaction
+        from django.http import HttpResponse
+        from openpyxl import Workbook
+        from rest_framework.test import APIRequestFactory
+
+        from api.exports import BORROWER_HEADERS, XLSX_CONTENT_TYPE, borrower_rows
+        from api.models import BorrowRequest, BorrowRequestItem
+        from api.views import BorrowRequestViewSet
+
+        # a host from ALLOWED_HOSTS; the default 'testserver' is rejected outside tests
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        today = datetime.date.today()
+        page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+        def rss():
+            try:
+                with open('/proc/self/statm') as fh:
+                    return int(fh.read().split()[1]) * page_size
+            except OSError:
+                return 0
+
+        def measure(build):
+            """Run `build()` -> response and read it fully; returns (ttfb, total, peak RSS growth, bytes)."""
+            baseline = rss()
+            peak = [baseline]
+            done = threading.Event()
+
+            def sample():
+                while not done.wait(0.005):
+                    peak[0] = max(peak[0], rss())
+
+            sampler = threading.Thread(target=sample, daemon=True)
+            sampler.start()
+            started = time.perf_counter()
+            ttfb = None
+            size = 0
+            try:
+                response = build()
+                if hasattr(response, 'render'):
+                    response.render()
+                chunks = response.streaming_content if response.streaming else [response.content]
+                for chunk in chunks:
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - started
+                    size += len(chunk)
+                response.close()
+            finally:
+                total = time.perf_counter() - started
+                done.set()
+                sampler.join()
+            peak[0] = max(peak[0], rss())
+            return ttfb or total, total, peak[0] - baseline, size
+
+        def view(viewset, action, path):
+            return lambda: viewset.as_view({'get': action})(factory.get(path))
+
+        def legacy_borrower_export():
+            # Whole workbook in memory, saved to BytesIO and copied into an HttpResponse
+            wb = Workbook()
+            ws = wb.active
+            ws.title = 'Borrower Report'
+            ws.append(BORROWER_HEADERS)
+            for row in borrower_rows(BorrowRequest.objects.all().order_by('-created_at')):
+                ws.append(row)
+            output = io.BytesIO()
+            wb.save(output)
+            output.seek(0)
+            return HttpResponse(output.read(), content_type=XLSX_CONTENT_TYPE)
+
+        # Closing a response ends the "request", which would close the connection mid-transaction
+        request_finished.disconnect(close_old_connections)
+        with transaction.atomic():
+            try:
+                created = 0
+                for size in sorted({int(part) for part in options['rows'].split(',') if part.strip()}):
+                    for start in range(created, size, 2000):
+                        batch = BorrowRequest.objects.bulk_create([
+                            BorrowRequest(
+                                request_id=f'BENCH-{n:07d}', student_name='Student', student_id=str(n),
+                                email='student@example.invalid', teacher_name='Teacher', purpose='Lab',
+                                borrow_date=today, return_date=today, status='returned',
+                            )
+                            for n in range(start, min(start + 2000, size))
+                        ])
+                        BorrowRequestItem.objects.bulk_create([
+                            BorrowRequestItem(borrow_request=req, item_name='Bench item', item_key='bench-000000',
+                                              quantity=1, status='returned')
+                            for req in batch
+                        ])
+                    created = max(created, size)
+                    for label, build in (
+                        # streamed first: memory the allocator keeps after the in-memory run would hide its peak
+                        ('write-only + temp file', view(
+                            BorrowRequestViewSet, 'export_borrowers_xlsx', '/api/borrow-requests/export_borrowers_xlsx/',
+                        )),
+                        ('in-memory workbook', legacy_borrower_export),
+                    ):
+                        ttfb, total, peak, nbytes = measure(build)
+                        self.stdout.write(
+                            f'{size:>7} rows  {label:<24} ttfb {ttfb:7.2f} s  total {total:7.2f} s  '
+                            f'peak RSS +{peak / 2**20:7.1f} MiB  ({nbytes / 2**20:.1f} MiB file)'
+                        )
+            finally:
+                transaction.set_rollback(True)
+                request_finished.connect(close_old_connections)
+
+        self.stdout.write('Export benchmark finished')
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Time the inventory, review and borrow-request serializers on in-memory rows (no database writes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Rows per serializer run')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per serializer; the best is reported')
+
+    def handle(self, *args, **options):
+        import datetime
+        import timeit
+
+        from django.core.files.storage import default_storage
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+
+        from api.images import media_url_builder
+        from api.models import BorrowRequest, BorrowRequestItem, InventoryItem, UserReview
+        from api.serializers import (
+            BorrowRequestItemDetailSerializer, BorrowRequestSerializer, InventoryItemSerializer, UserReviewSerializer,
+        )
+
+        rows = max(1, options['rows'])
+        repeat = max(1, options['repeat'])
+        today = datetime.date.today()
+
+        def new_request():
+            # a fresh request per run so the per-request URL builder cache starts empty
+            # a host from ALLOWED_HOSTS; the default 'testserver' is rejected outside tests
+            return Request(APIRequestFactory(SERVER_NAME='localhost').get('/api/inventory/'))
+
+        items = []
+        for i in range(rows):
+            item = InventoryItem(
+                pk=i + 1, item_key=f'item-{i}', name=f'Item {i}', stock=10,
+                image=f'inventory_images/item_{i}.jpg', image_width=1200, image_height=800,
+                image_variants={
+                    'source': f'inventory_images/item_{i}.jpg',
+                    **{name: {'width': 100, 'height': 80, 'jpeg': f'variants/inventory_images/item_{i}_{name}.jpg',
+                              'webp': f'variants/inventory_images/item_{i}_{name}.webp'}
+                       for name in ('thumb', 'card', 'full')},
+                },
+            )
+            item.active_borrowed = i % 3
+            items.append(item)
+        reviews = [
+            UserReview(pk=i + 1, item_name=f'Item {i}', comment='Loose knob', image=f'review_images/r_{i}.jpg')
+            for i in range(rows)
+        ]
+        requests = []
+        loan_items = []
+        for i in range(rows):
+            req = BorrowRequest(
+                pk=i + 1, request_id=f'REQ-{i}', student_name='Student', student_id=str(i), email='s@example.com',
+                teacher_name='Teacher', purpose='Lab', borrow_date=today, return_date=today, status='borrowed',
+            )
+            req_items = [
+                BorrowRequestItem(pk=i * 2 + n + 1, borrow_request=req, item_name='Item', item_key='item', quantity=1)
+                for n in range(2)
+            ]
+            req._prefetched_objects_cache = {'items': req_items}
+            requests.append(req)
+            loan_items.extend(req_items)
+
+        cases = [
+            ('InventoryItemSerializer', InventoryItemSerializer, items),
+            ('UserReviewSerializer', UserReviewSerializer, reviews),
+            ('BorrowRequestSerializer', BorrowRequestSerializer, requests),
+            ('BorrowRequestItemDetailSerializer', BorrowRequestItemDetailSerializer, loan_items),
+        ]
+        for label, serializer_class, objs in cases:
+            best = min(timeit.repeat(
+                lambda: serializer_class(objs, many=True, context={'request': new_request()}).data,
+                number=1, repeat=repeat,
+            ))
+            self.stdout.write(f'{label:<36} {len(objs):>6} rows  {best * 1000:8.1f} ms  {len(objs) / best:>10.0f} rows/s')
+
+        # The per-row URL work the request-scoped builder replaces
+        names = [item.image.name for item in items]
+
+        def per_row():
+            request = new_request()
+            return [request.build_absolute_uri(default_storage.url(name)) for name in names]
+
+        def cached():
+            url_for = media_url_builder(new_request())
+            return [url_for(name) for name in names]
+
+        for label, fn in (('absolute URLs, per row', per_row), ('absolute URLs, cached base', cached)):
+            best = min(timeit.repeat(fn, number=1, repeat=repeat))
+            self.stdout.write(f'{label:<36} {rows:>6} rows  {best * 1000:8.1f} ms')
+
+        self.stdout.write('Serializer benchmark finished')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Generate resized JPEG/WebP variants for inventory and review images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=['inventory', 'review'], help='Only process one model')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that are already up to date')
+        parser.add_argument('--workers', type=int, default=4, help='Images resized in parallel')
+
+    def handle(self, *args, **options):
+        from concurrent.futures import ThreadPoolExecutor
+        from api.images import needs_variants, process_in_worker
+        from api.models import InventoryItem, UserReview
+
+        models = {'inventory': InventoryItem, 'review': UserReview}
+        if options['model']:
+            models = {options['model']: models[options['model']]}
+
+        summary = []
+        for label, model in models.items():
+            candidates = model.objects.exclude(image='').exclude(image__isnull=True).only('pk', 'image', 'image_variants')
+            pks = [obj.pk for obj in candidates.iterator() if options['force'] or needs_variants(obj)]
+            with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+                done = sum(pool.map(lambda pk: process_in_worker(model, pk, force=options['force']), pks))
+            summary.append(f'{label}: {done}/{len(pks)}')
+            if done < len(pks):
+                self.stderr.write(f'{len(pks) - done} {label} image(s) could not be processed; see the log for details.')
+
+        self.stdout.write(f"Image variants finished — {', '.join(summary)}")
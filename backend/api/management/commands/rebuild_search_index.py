@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents for inventory items, reviews and borrow requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=['inventory', 'review', 'request'], help='Only rebuild one document type')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Documents inserted per query')
+
+    def handle(self, *args, **options):
+        from django.db import transaction
+        from api.search import INDEXED_MODELS, rebuild_index
+
+        counts = []
+        for model, (doc_type, _build, _fields) in INDEXED_MODELS.items():
+            if options['type'] and options['type'] != doc_type:
+                continue
+            with transaction.atomic():
+                total = rebuild_index(model, batch_size=max(1, options['batch_size']))
+            counts.append(f'{doc_type}: {total}')
+
+        self.stdout.write(f"Search index rebuild finished — {', '.join(counts)}")
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Rebuild InventoryItem borrowed/reserved counters from borrow request items and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write corrected counters')
+
+    def handle(self, *args, **options):
+        from django.db import transaction
+
+        from api.availability import compute_counters
+        from api.conditional import bump_catalog_version
+        from api.models import InventoryItem
+
+        with transaction.atomic():
+            # Lock every inventory row (in the key order approvals use) before
+            # counting, so no approval or return can move a counter between
+            # the count and the write below
+            items = list(
+                InventoryItem.objects.select_for_update()
+                .order_by('item_key')
+                .only('id', 'item_key', 'borrowed_units', 'reserved_units')
+            )
+            expected = compute_counters()
+            now = timezone.now()
+            drifted = []
+            for item in items:
+                want = expected.get(item.item_key, {})
+                borrowed = want.get('borrowed_units', 0)
+                reserved = want.get('reserved_units', 0)
+                if item.borrowed_units != borrowed or item.reserved_units != reserved:
+                    self.stdout.write(
+                        f'{item.item_key}: borrowed {item.borrowed_units} -> {borrowed}, '
+                        f'reserved {item.reserved_units} -> {reserved}'
+                    )
+                    item.borrowed_units = borrowed
+                    item.reserved_units = reserved
+                    item.updated_at = now
+                    drifted.append(item)
+
+            known_keys = {item.item_key for item in items}
+            orphaned = sorted(key for key in expected if key not in known_keys)
+            if orphaned:
+                self.stderr.write(f'Borrowed/reserved items with no matching inventory item_key: {", ".join(orphaned)}')
+
+            if drifted and not options['dry_run']:
+                InventoryItem.objects.bulk_update(drifted, ['borrowed_units', 'reserved_units', 'updated_at'], batch_size=500)
+                bump_catalog_version()
+
+        action = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(f'Reconcile finished — items with drift: {len(drifted)} ({action}), orphaned keys: {len(orphaned)}')
@@ -0,0 +1,105 @@
+from django.core.management.base import BaseCommand
+import logging
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# Pool processes are spawned, so they import this module (not api.jobs, whose
+# model imports need the app registry) and set Django up before running jobs.
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _run_job(job_id):
+    from api.jobs import run_in_worker
+    return run_in_worker(job_id)
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (exports, bulk imports) on a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Jobs run in parallel; 0 runs them in this process')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new jobs')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to wait between polls with --loop')
+        parser.add_argument('--purge-days', type=float, default=7.0,
+                            help='Delete finished jobs and their files after this many days; 0 keeps them')
+
+    def handle(self, *args, **options):
+        import multiprocessing
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        from concurrent.futures.process import BrokenProcessPool
+        from datetime import timedelta
+        from django.utils import timezone
+        from api.jobs import claim_jobs, purge_jobs, run_job
+        from api.models import Job
+
+        workers = max(0, options['workers'])
+        counts = {'succeeded': 0, 'failed': 0, 'lost': 0}
+
+        if options['purge_days'] > 0:
+            purged = purge_jobs(timezone.now() - timedelta(days=options['purge_days']))
+            if purged:
+                self.stdout.write(f'Purged {purged} finished job(s)')
+
+        if workers == 0:
+            while True:
+                job_ids = claim_jobs(1)
+                for job_id in job_ids:
+                    try:
+                        counts[run_job(job_id)] += 1
+                    except Exception:
+                        # e.g. the database went away; the job is retried once its lease expires
+                        logger.exception('Job %s could not be run', job_id)
+                        counts['failed'] += 1
+                if not job_ids:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        else:
+            # Spawned (not forked) processes so no DB connection is shared with this one
+            context = multiprocessing.get_context('spawn')
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+            running = {}
+            try:
+                while True:
+                    free = workers - len(running)
+                    if free:
+                        for job_id in claim_jobs(free):
+                            running[pool.submit(_run_job, job_id)] = job_id
+                    if not running:
+                        if not options['loop']:
+                            break
+                        time.sleep(options['interval'])
+                        continue
+                    done, _pending = wait(running, timeout=options['interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job_id = running.pop(future)
+                        try:
+                            counts[future.result()] += 1
+                        except BrokenProcessPool as exc:
+                            # A worker process died; fail the job now instead of waiting for its lease
+                            Job.objects.filter(pk=job_id, status='running').update(
+                                status='failed', error=f'worker process died: {exc}', finished_at=timezone.now(),
+                                lease_expires_at=None,
+                            )
+                            counts['failed'] += 1
+                        except Exception:
+                            # Raised around the job, not by it (run_job records job errors itself),
+                            # e.g. the database went away; the job is retried once its lease expires
+                            logger.exception('Job %s could not be run', job_id)
+                            counts['failed'] += 1
+                    if not running and any(isinstance(f.exception(), BrokenProcessPool) for f in done):
+                        # A broken pool accepts no more work; start a fresh one
+                        pool.shutdown(wait=False)
+                        pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker)
+            finally:
+                pool.shutdown()
+
+        self.stdout.write(
+            f"Worker finished — jobs succeeded: {counts['succeeded']}, failed: {counts['failed']}"
+            + (f", taken over after an expired lease: {counts['lost']}" if counts['lost'] else '')
+        )
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+
+class Command(BaseCommand):
+    help = "Collect overdue loans and send one reminder digest per student"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='Treat this date (YYYY-MM-DD) as today')
+        parser.add_argument('--send', action='store_true', help='Email the digests (default: only print them)')
+        parser.add_argument('--dry-run', action='store_true', help='With --send, do not mark requests as notified')
+        parser.add_argument('--resend-hours', type=float, default=24.0,
+                            help='Remind again after this many hours; 0 reminds only once')
+        parser.add_argument('--batch-size', type=int, default=200, help='Students processed per batch')
+
+    def handle(self, *args, **options):
+        from api.overdue import (
+            build_digests, due_for_reminder, mark_notified, overdue_requests, render_digest, send_digests,
+            with_open_items,
+        )
+
+        as_of = None
+        if options['as_of']:
+            as_of = parse_date(options['as_of'])
+            if as_of is None:
+                raise CommandError(f"invalid --as-of date: {options['as_of']}")
+        resend_after = timedelta(hours=options['resend_hours']) if options['resend_hours'] > 0 else None
+        batch_size = max(1, options['batch_size'])
+
+        candidates = due_for_reminder(overdue_requests(as_of), resend_after)
+        student_ids = list(candidates.order_by('student_id').values_list('student_id', flat=True).distinct())
+
+        total_digests = 0
+        total_loans = 0
+        total_sent = 0
+        # Whole students per batch so nobody gets their loans split over two digests
+        for start in range(0, len(student_ids), batch_size):
+            batch = student_ids[start:start + batch_size]
+            digests = build_digests(with_open_items(candidates.filter(student_id__in=batch)), as_of)
+            total_digests += len(digests)
+            total_loans += sum(len(d['loans']) for d in digests)
+            if options['send']:
+                # send_mass_mail raises on failure, so every digest with an address went out
+                sent = [digest for digest in digests if digest['email']]
+                total_sent += send_digests(sent)
+                if not options['dry_run']:
+                    mark_notified(sent)
+            else:
+                # Printing is only a preview; a later --send run must still remind these students
+                for digest in digests:
+                    subject, body = render_digest(digest)
+                    self.stdout.write(f"To: {digest['email']}\nSubject: {subject}\n\n{body}\n")
+
+        self.stdout.write(
+            f'Overdue sweep finished — students: {total_digests}, overdue loans: {total_loans}, emails sent: {total_sent}'
+            + (' (dry run)' if options['dry_run'] else '')
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = "Push pending inventory changes from the sync outbox to the Supabase mirror table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Maximum number of items per upsert request')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll the outbox for new changes')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Requeue rows that ran out of attempts before draining')
+
+    def handle(self, *args, **options):
+        from api.supabase_sync import drain_outbox, get_config, retry_failed
+
+        if get_config() is None:
+            self.stderr.write('SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY are not configured; changes stay queued.')
+            return
+        if options['retry_failed']:
+            self.stdout.write(f'Requeued {retry_failed()} failed outbox rows')
+
+        batch_size = max(1, options['batch_size'])
+        total_synced = 0
+        total_failed = 0
+        while True:
+            # Drain everything that is currently due, one batch at a time
+            while True:
+                synced, failed = drain_outbox(batch_size=batch_size)
+                total_synced += synced
+                total_failed += failed
+                if not synced:
+                    break
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(f'Supabase sync finished — items synced: {total_synced}, rows failed: {total_failed}')
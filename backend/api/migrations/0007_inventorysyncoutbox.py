@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_borrowrequestitem_actual_returned_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySyncOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_events', to='api.inventoryitem')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['next_attempt_at', 'id'], name='api_invento_next_at_0b1d07_idx')],
+            },
+        ),
+    ]
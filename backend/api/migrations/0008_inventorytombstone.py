@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_inventorysyncoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_id', models.BigIntegerField()),
+                ('item_key', models.CharField(max_length=100)),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['updated_at', 'id'], name='api_invento_updated_e2059e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='api_invento_deleted_735860_idx'),
+        ),
+    ]
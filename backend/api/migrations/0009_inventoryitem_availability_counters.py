@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:09
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+from django.db.models.functions import Lower
+
+
+COUNTER_FIELDS = {'borrowed': 'borrowed_units', 'approved': 'reserved_units'}
+
+
+def populate_counters(apps, schema_editor):
+    InventoryItem = apps.get_model('api', 'InventoryItem')
+    BorrowRequestItem = apps.get_model('api', 'BorrowRequestItem')
+    rows = (
+        BorrowRequestItem.objects
+        .filter(Q(status__iexact='borrowed') | Q(status__iexact='approved'))
+        .order_by()
+        .annotate(status_lower=Lower('status'))
+        .values('item_key', 'status_lower')
+        .annotate(total=Sum('quantity'))
+    )
+    totals = {}
+    for row in rows:
+        field = COUNTER_FIELDS[row['status_lower']]
+        totals.setdefault(row['item_key'], {})[field] = row['total'] or 0
+    items = list(InventoryItem.objects.filter(item_key__in=list(totals)))
+    for item in items:
+        for field, value in totals[item.item_key].items():
+            setattr(item, field, value)
+    InventoryItem.objects.bulk_update(items, list(COUNTER_FIELDS.values()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_inventorytombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='borrowed_units',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='reserved_units',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
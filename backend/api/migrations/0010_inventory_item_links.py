@@ -0,0 +1,80 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def _link_model(model, key_ids, name_ids):
+    """Fill `inventory_item` for unlinked rows of `model`, BATCH_SIZE rows at a time."""
+    last_pk = 0
+    while True:
+        batch = list(
+            model.objects
+            .filter(inventory_item__isnull=True, pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'item_key', 'item_name')[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        linked = []
+        for row in batch:
+            item_id = key_ids.get(row.item_key) or name_ids.get((row.item_name or '').strip().lower())
+            if item_id:
+                row.inventory_item_id = item_id
+                linked.append(row)
+        model.objects.bulk_update(linked, ['inventory_item'])
+
+
+def link_inventory_items(apps, schema_editor):
+    InventoryItem = apps.get_model('api', 'InventoryItem')
+    key_ids = {}
+    name_ids = {}
+    duplicate_names = set()
+    for pk, item_key, name in InventoryItem.objects.values_list('pk', 'item_key', 'name').iterator():
+        key_ids[item_key] = pk
+        name = (name or '').strip().lower()
+        if name in name_ids:
+            duplicate_names.add(name)
+        name_ids[name] = pk
+    # An ambiguous name cannot identify an item
+    for name in duplicate_names | {''}:
+        name_ids.pop(name, None)
+    _link_model(apps.get_model('api', 'BorrowRequestItem'), key_ids, name_ids)
+    _link_model(apps.get_model('api', 'UserReview'), key_ids, name_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_inventoryitem_availability_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowrequestitem',
+            name='inventory_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrow_items', to='api.inventoryitem'),
+        ),
+        migrations.AddField(
+            model_name='userreview',
+            name='inventory_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to='api.inventoryitem'),
+        ),
+        migrations.RunPython(link_inventory_items, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='borrowrequestitem',
+            index=models.Index(fields=['inventory_item', 'status'], name='api_borrowr_invento_cce93b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowrequestitem',
+            index=models.Index(fields=['item_key', 'status'], name='api_borrowr_item_ke_504e0d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userreview',
+            index=models.Index(fields=['inventory_item', '-created_at'], name='api_userrev_invento_a1eca5_idx'),
+        ),
+    ]
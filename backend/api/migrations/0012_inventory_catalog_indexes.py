@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+TRIGRAM_COLUMNS = ('name', 'description', 'use')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Postgres only: GIN trigram indexes on the expression `icontains` filters on
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS api_inventoryitem_{column}_trgm '
+            f'ON api_inventoryitem USING gin (UPPER("{column}"::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS api_inventoryitem_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_borrowrequest_overdue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['name', 'id'], name='api_invento_name_919381_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['category', 'name'], name='api_invento_categor_d67372_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['cabinet', 'name'], name='api_invento_cabinet_3d8bea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['type', 'name'], name='api_invento_type_7da225_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
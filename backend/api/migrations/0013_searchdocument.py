@@ -0,0 +1,163 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE api_searchdocument ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX api_searchdocument_vector_gin ON api_searchdocument USING gin (search_vector)',
+]
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS api_searchdocument_vector_gin',
+    'ALTER TABLE api_searchdocument DROP COLUMN IF EXISTS search_vector',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE api_searchdocument_fts USING fts5(
+        title, body, content='api_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER api_searchdocument_fts_ai AFTER INSERT ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER api_searchdocument_fts_ad AFTER DELETE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER api_searchdocument_fts_au AFTER UPDATE ON api_searchdocument BEGIN
+        INSERT INTO api_searchdocument_fts(api_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO api_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_ai',
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_ad',
+    'DROP TRIGGER IF EXISTS api_searchdocument_fts_au',
+    'DROP TABLE IF EXISTS api_searchdocument_fts',
+]
+
+
+def _sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_fulltext_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    elif connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        statements = SQLITE_FORWARD
+    else:
+        # api.search falls back to icontains over title/body
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+# Frozen copies of the api.search document builders as of this migration, so
+# later changes to that module cannot change (or break) what this step writes.
+# Rebuild with `manage.py rebuild_search_index` after changing the builders.
+def _clip(text, length=255):
+    text = ' '.join(str(text or '').split())
+    return text if len(text) <= length else text[:length - 1] + '…'
+
+
+def _inventory_document(item):
+    return {
+        'title': _clip(item.name),
+        'subtitle': _clip(' · '.join(p for p in (item.item_key, item.category, item.cabinet) if p)),
+        'body': ' '.join(str(p or '') for p in (
+            item.item_key, item.category, item.cabinet, item.type, item.description, item.use,
+        )),
+    }
+
+
+def _review_document(review):
+    return {
+        'title': _clip(review.item_name),
+        'subtitle': _clip(review.comment),
+        'body': ' '.join(str(p or '') for p in (
+            review.item_key, review.comment, review.submitted_by_name, review.submitted_by_email,
+        )),
+    }
+
+
+def _request_document(req):
+    return {
+        'title': _clip(f'{req.request_id} — {req.student_name}'),
+        'subtitle': _clip(req.purpose),
+        'body': ' '.join(str(p or '') for p in (
+            req.student_name, req.student_id, req.email, req.teacher_name, req.purpose,
+        )),
+    }
+
+
+DOCUMENT_BUILDERS = [
+    ('InventoryItem', 'inventory', _inventory_document),
+    ('UserReview', 'review', _review_document),
+    ('BorrowRequest', 'request', _request_document),
+]
+
+
+def populate_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('api', 'SearchDocument')
+    for model_name, doc_type, build in DOCUMENT_BUILDERS:
+        model = apps.get_model('api', model_name)
+        batch = []
+        for instance in model.objects.order_by('pk').iterator(chunk_size=1000):
+            batch.append(SearchDocument(doc_type=doc_type, object_id=instance.pk, **build(instance)))
+            if len(batch) >= 1000:
+                SearchDocument.objects.bulk_create(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_inventory_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('inventory', 'Inventory item'), ('review', 'Review'), ('request', 'Borrow request')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('subtitle', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
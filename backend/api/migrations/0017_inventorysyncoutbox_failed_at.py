@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorysyncoutbox',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,7 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -13,20 +16,75 @@ class InventoryItem(models.Model):
 	type = models.CharField(max_length=100, blank=True)
 	use = models.CharField(max_length=255, blank=True)
 	image = models.ImageField(upload_to='inventory_images/', blank=True, null=True)
+	# Original pixel size and resized variants, filled in by api.images
+	image_width = models.PositiveIntegerField(null=True, blank=True)
+	image_height = models.PositiveIntegerField(null=True, blank=True)
+	image_variants = models.JSONField(default=dict, blank=True)
+
+	# Materialized availability counters, maintained by api.availability on
+	# item status transitions and rebuilt by `manage.py reconcile_availability`
+	borrowed_units = models.IntegerField(default=0)
+	reserved_units = models.IntegerField(default=0)
 
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
+	class Meta:
+		indexes = [
+			models.Index(fields=['updated_at', 'id']),
+			# Catalog filters; name keeps the default ordering index-backed
+			models.Index(fields=['name', 'id']),
+			models.Index(fields=['category', 'name']),
+			models.Index(fields=['cabinet', 'name']),
+			models.Index(fields=['type', 'name']),
+		]
+
 	def __str__(self):
 		return f"{self.name} ({self.item_key})"
 
 
+class InventoryTombstone(models.Model):
+	"""Deletion log for inventory items, used by the delta sync endpoint."""
+	item_id = models.BigIntegerField()
+	item_key = models.CharField(max_length=100)
+	deleted_at = models.DateTimeField(default=timezone.now)
+
+	class Meta:
+		ordering = ['deleted_at', 'id']
+		indexes = [
+			models.Index(fields=['deleted_at', 'id']),
+		]
+
+	def __str__(self):
+		return f"Deleted {self.item_key} ({self.item_id})"
+
+
+class CatalogVersion(models.Model):
+	"""Single-row change counter behind the catalog ETag (see api.conditional).
+
+	Bumped in the same transaction as every inventory write, so its value
+	changes exactly when the write becomes visible to readers.
+	"""
+	version = models.BigIntegerField(default=0)
+	changed_at = models.DateTimeField(default=timezone.now)
+
+	def __str__(self):
+		return f"Catalog version {self.version}"
+
+
 class UserReview(models.Model):
 	"""Stores user-submitted reviews/feedback about items."""
 	item_name = models.CharField(max_length=255)
 	item_key = models.CharField(max_length=150, blank=True, null=True)
+	# Resolved from item_key/item_name; the denormalized fields keep the history
+	inventory_item = models.ForeignKey(
+		InventoryItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviews',
+	)
 	comment = models.TextField(blank=True)
 	image = models.ImageField(upload_to='review_images/', blank=True, null=True)
+	image_width = models.PositiveIntegerField(null=True, blank=True)
+	image_height = models.PositiveIntegerField(null=True, blank=True)
+	image_variants = models.JSONField(default=dict, blank=True)
 
 	submitted_by_name = models.CharField(max_length=255, blank=True, null=True)
 	submitted_by_email = models.CharField(max_length=255, blank=True, null=True)
@@ -37,6 +95,9 @@ class UserReview(models.Model):
 
 	class Meta:
 		ordering = ['-created_at']
+		indexes = [
+			models.Index(fields=['inventory_item', '-created_at']),
+		]
 
 	def __str__(self):
 		return f"Review {self.id} - {self.item_name} by {self.submitted_by_name or 'anonymous'}"
@@ -68,12 +129,16 @@ class BorrowRequest(models.Model):
 	# Optional remark from admin when approving/rejecting
 	admin_remark = models.TextField(blank=True, null=True)
 	remark_type = models.CharField(max_length=50, blank=True, null=True)
+
+	# Last overdue reminder sent by `manage.py sweep_overdue`
+	overdue_notified_at = models.DateTimeField(null=True, blank=True)
 	
 	class Meta:
 		ordering = ['-created_at']
 		indexes = [
 			models.Index(fields=['status', '-created_at']),
 			models.Index(fields=['student_id', '-created_at']),
+			models.Index(fields=['status', 'return_date']),
 		]
 	
 	def __str__(self):
@@ -93,6 +158,10 @@ class BorrowRequestItem(models.Model):
 	borrow_request = models.ForeignKey(BorrowRequest, on_delete=models.CASCADE, related_name='items')
 	item_name = models.CharField(max_length=255)
 	item_key = models.CharField(max_length=150, blank=True, null=True)
+	# Resolved from item_key/item_name; the denormalized fields keep the history
+	inventory_item = models.ForeignKey(
+		InventoryItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='borrow_items',
+	)
 	quantity = models.IntegerField(default=1)
 	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
 	
@@ -106,6 +175,110 @@ class BorrowRequestItem(models.Model):
 
 	# Timestamp when this specific item was actually returned
 	actual_returned_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['inventory_item', 'status']),
+			models.Index(fields=['item_key', 'status']),
+		]
 	
 	def __str__(self):
 		return f"{self.item_name} x{self.quantity} ({self.status}) (Request {self.borrow_request.request_id})"
+
+
+class InventorySyncOutbox(models.Model):
+	"""Inventory changes waiting to be pushed to the Supabase mirror table.
+
+	Rows are written in the same transaction as the stock change and drained
+	by the `sync_supabase` management command. Several rows for one item are
+	coalesced into a single upsert of the item's current state. Rows that
+	keep failing are parked with `failed_at` set until they are retried
+	(`sync_supabase --retry-failed`).
+	"""
+	item = models.ForeignKey(InventoryItem, on_delete=models.CASCADE, related_name='sync_events')
+	created_at = models.DateTimeField(auto_now_add=True)
+	attempts = models.IntegerField(default=0)
+	next_attempt_at = models.DateTimeField(default=timezone.now)
+	last_error = models.TextField(blank=True)
+	# Set when the row ran out of attempts; failed rows are no longer claimed
+	failed_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		ordering = ['id']
+		indexes = [
+			models.Index(fields=['next_attempt_at', 'id']),
+		]
+
+	def __str__(self):
+		state = 'failed' if self.failed_at else f'attempts: {self.attempts}'
+		return f"Sync item {self.item_id} ({state})"
+
+
+class SearchDocument(models.Model):
+	"""Denormalized search text for one inventory item, review or borrow request.
+
+	Maintained by api.search; the database-specific full-text index over
+	`title` and `body` is created by migration 0013.
+	"""
+	DOC_TYPE_CHOICES = [
+		('inventory', 'Inventory item'),
+		('review', 'Review'),
+		('request', 'Borrow request'),
+	]
+
+	doc_type = models.CharField(max_length=20, choices=DOC_TYPE_CHOICES)
+	object_id = models.BigIntegerField()
+	title = models.CharField(max_length=255)
+	subtitle = models.CharField(max_length=255, blank=True)
+	body = models.TextField(blank=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['doc_type', 'object_id'], name='unique_search_document'),
+		]
+
+	def __str__(self):
+		return f"{self.doc_type} {self.object_id}: {self.title}"
+
+
+def job_artifact_path(instance, filename):
+	return f"jobs/{instance.pk}/{filename}"
+
+
+class Job(models.Model):
+	"""Background job queued by the API and run by `manage.py run_worker` (see api.jobs).
+
+	The UUID key makes the polling URL and the artifact path unguessable.
+	"""
+	STATUS_CHOICES = [
+		('queued', 'Queued'),
+		('running', 'Running'),
+		('succeeded', 'Succeeded'),
+		('failed', 'Failed'),
+	]
+
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	kind = models.CharField(max_length=50)
+	params = models.JSONField(default=dict, blank=True)
+	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+	# Summary returned by the job, e.g. an import report
+	result = models.JSONField(default=dict, blank=True)
+	artifact = models.FileField(upload_to=job_artifact_path, blank=True, null=True)
+	error = models.TextField(blank=True)
+	attempts = models.IntegerField(default=0)
+	# A running job whose lease expired (worker died) is picked up again
+	lease_expires_at = models.DateTimeField(null=True, blank=True)
+
+	created_at = models.DateTimeField(auto_now_add=True)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		ordering = ['created_at']
+		indexes = [
+			models.Index(fields=['status', 'created_at']),
+		]
+
+	def __str__(self):
+		return f"{self.kind} job {self.pk} ({self.status})"
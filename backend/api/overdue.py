@@ -0,0 +1,107 @@
+"""Overdue loan detection and reminder digests.
+
+A loan is overdue when its request is still 'borrowed' and its `return_date`
+is before today. `overdue_requests` filters on exactly the `(status,
+return_date)` index, so only overdue candidates are read. `build_digests`
+groups the overdue loans by student so each student gets one reminder listing
+everything they still hold, and `mark_notified` stamps the reminded requests
+with a single UPDATE.
+"""
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .models import BorrowRequest, BorrowRequestItem
+
+
+def overdue_requests(as_of=None):
+    """Borrowed requests whose return date is before `as_of` (default: today)."""
+    as_of = as_of or timezone.localdate()
+    return (
+        BorrowRequest.objects
+        .filter(status='borrowed', return_date__lt=as_of)
+        .order_by('return_date', 'id')
+    )
+
+
+def with_open_items(queryset):
+    """Prefetch only the items that are still out, in id order."""
+    return queryset.prefetch_related(
+        Prefetch('items', BorrowRequestItem.objects.filter(status='borrowed').order_by('id'), to_attr='open_items')
+    )
+
+
+def due_for_reminder(queryset, resend_after=None, now=None):
+    """Restrict to requests not reminded within `resend_after` (never reminded if None)."""
+    if resend_after is None:
+        return queryset.filter(overdue_notified_at__isnull=True)
+    cutoff = (now or timezone.now()) - resend_after
+    return queryset.filter(Q(overdue_notified_at__isnull=True) | Q(overdue_notified_at__lt=cutoff))
+
+
+def build_digests(requests, as_of=None):
+    """Group overdue requests (with `open_items` prefetched) into one digest per student.
+
+    Returns a list of `{student_id, student_name, email, request_ids, loans}`
+    where each loan is `{request_id, return_date, days_overdue, items}`.
+    Requests with no item still out are left out.
+    """
+    as_of = as_of or timezone.localdate()
+    digests = {}
+    for req in requests:
+        items = getattr(req, 'open_items', None)
+        if items is None:
+            items = list(req.items.filter(status='borrowed').order_by('id'))
+        if not items:
+            continue
+        digest = digests.setdefault(req.student_id, {
+            'student_id': req.student_id,
+            'student_name': req.student_name,
+            'email': req.email,
+            'request_ids': [],
+            'loans': [],
+        })
+        digest['request_ids'].append(req.pk)
+        digest['loans'].append({
+            'request_id': req.request_id,
+            'return_date': req.return_date,
+            'days_overdue': (as_of - req.return_date).days,
+            'items': [{'item_name': it.item_name, 'item_key': it.item_key, 'quantity': it.quantity} for it in items],
+        })
+    return list(digests.values())
+
+
+def render_digest(digest):
+    """Plain-text `(subject, body)` for one student's reminder."""
+    count = sum(len(loan['items']) for loan in digest['loans'])
+    subject = f"Overdue lab equipment: {count} item{'s' if count != 1 else ''} to return"
+    lines = [f"Hello {digest['student_name']},", '', 'The following borrowed items are past their return date:', '']
+    for loan in digest['loans']:
+        lines.append(f"Request {loan['request_id']} (due {loan['return_date']}, {loan['days_overdue']} day(s) overdue):")
+        for item in loan['items']:
+            lines.append(f"  - {item['item_name']} x{item['quantity']}")
+    lines += ['', 'Please return them to the laboratory as soon as possible.']
+    return subject, '\n'.join(lines)
+
+
+def send_digests(digests, from_email=None):
+    """Send every digest over one mail connection; returns the number sent."""
+    from_email = from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', None)
+    messages = []
+    for digest in digests:
+        if not digest['email']:
+            continue
+        subject, body = render_digest(digest)
+        messages.append((subject, body, from_email, [digest['email']]))
+    if not messages:
+        return 0
+    return send_mass_mail(messages, fail_silently=False)
+
+
+def mark_notified(digests, now=None):
+    """Stamp `overdue_notified_at` on every request in `digests` with one UPDATE."""
+    request_ids = [pk for digest in digests for pk in digest['request_ids']]
+    if not request_ids:
+        return 0
+    return BorrowRequest.objects.filter(pk__in=request_ids).update(overdue_notified_at=now or timezone.now())
@@ -0,0 +1,142 @@
+"""Keyset (seek) pagination helpers.
+
+Unlike offset pagination, keyset pagination filters on the last row seen, so
+fetching page N costs the same index range scan as fetching page 1. Cursors are
+opaque base64 tokens encoding the `(timestamp, id)` pair of the last row.
+
+`OptionalCatalogPagination` is the DRF pagination class of the inventory list;
+it wraps DRF's page-number and cursor paginators behind opt-in parameters.
+"""
+import base64
+import json
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(value)
+        return parsed, int(pk)
+    except Exception:
+        raise InvalidCursor('invalid cursor')
+
+
+class KeysetPaginator:
+    """Paginate a queryset by a datetime field with the primary key as tie-breaker.
+
+    `key_field` may traverse relations (e.g. 'borrow_request__created_at').
+    Pages are ordered newest-first when `descending` is True.
+    """
+
+    def __init__(self, key_field, descending=True, default_page_size=100, max_page_size=1000):
+        self.key_field = key_field
+        self.descending = descending
+        self.default_page_size = default_page_size
+        self.max_page_size = max_page_size
+
+    def is_requested(self, request):
+        params = request.query_params
+        return 'cursor' in params or 'page_size' in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get('page_size', self.default_page_size))
+        except (TypeError, ValueError):
+            size = self.default_page_size
+        return max(1, min(size, self.max_page_size))
+
+    def order(self, queryset):
+        if self.descending:
+            return queryset.order_by(F(self.key_field).desc(), '-id')
+        return queryset.order_by(F(self.key_field).asc(), 'id')
+
+    def paginate(self, queryset, request):
+        """Return `(rows, next_cursor)` for the page selected by `?cursor=`.
+
+        Raises InvalidCursor if the cursor cannot be decoded.
+        """
+        queryset = self.order(queryset)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            value, pk = decode_cursor(cursor)
+            if self.descending:
+                queryset = queryset.filter(
+                    Q(**{f'{self.key_field}__lt': value}) | Q(**{self.key_field: value, 'id__lt': pk})
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{self.key_field}__gt': value}) | Q(**{self.key_field: value, 'id__gt': pk})
+                )
+
+        page_size = self.get_page_size(request)
+        # Fetch one extra row to learn whether another page exists
+        rows = list(queryset[:page_size + 1])
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            value = last
+            for part in self.key_field.split('__'):
+                value = getattr(value, part)
+            next_cursor = encode_cursor(value, last.id)
+        return rows, next_cursor
+
+    def get_next_link(self, request, next_cursor):
+        if not next_cursor:
+            return None
+        params = request.query_params.copy()
+        params['cursor'] = next_cursor
+        return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+class CatalogPageNumberPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class CatalogCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('name', 'id')
+
+
+class OptionalCatalogPagination(BasePagination):
+    """Pagination for the inventory list that stays off unless asked for.
+
+    `?page=` / `?page_size=` select page-number pagination (with a total
+    `count`), `?cursor=` or `?pagination=cursor` select cursor pagination
+    ordered by (name, id). Without any of them the full list is returned as
+    before, so existing clients keep working.
+    """
+
+    def __init__(self):
+        self.paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if 'cursor' in params or params.get('pagination') == 'cursor':
+            self.paginator = CatalogCursorPagination()
+        elif 'page' in params or 'page_size' in params:
+            self.paginator = CatalogPageNumberPagination()
+        else:
+            return None
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
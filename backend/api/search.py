@@ -0,0 +1,225 @@
+"""Unified full-text search over inventory items, reviews and borrow requests.
+
+Every searchable object has one `SearchDocument` row holding its display
+`title`/`subtitle` and the concatenated searchable text. Rows are kept current
+by the signals in `api.signals` and can be rebuilt with
+`manage.py rebuild_search_index`.
+
+The full-text index itself lives in the database (migration 0013):
+
+- Postgres: a generated `search_vector` tsvector column (title weighted above
+  body) with a GIN index.
+- SQLite: an external-content FTS5 table `api_searchdocument_fts` kept in
+  sync by triggers, ranked with bm25. SQLite migrations that alter a table rebuild it
+  and drop its triggers, so a later migration touching `api_searchdocument`
+  must recreate them.
+- Anything else, or SQLite built without FTS5, falls back to `icontains`.
+
+`search` ranks the matches and returns the best `limit` per type in one query
+using a window function, with every search term treated as a prefix.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import BorrowRequest, InventoryItem, SearchDocument, UserReview
+
+
+DOC_TYPES = ('inventory', 'review', 'request')
+MAX_TERMS = 8
+MAX_LIMIT = 50
+
+FTS_TABLE = 'api_searchdocument_fts'
+
+_fts_available = None
+
+
+def _clip(text, length=255):
+    text = ' '.join(str(text or '').split())
+    return text if len(text) <= length else text[:length - 1] + '…'
+
+
+def _inventory_document(item):
+    return {
+        'title': _clip(item.name),
+        'subtitle': _clip(' · '.join(p for p in (item.item_key, item.category, item.cabinet) if p)),
+        'body': ' '.join(str(p or '') for p in (
+            item.item_key, item.category, item.cabinet, item.type, item.description, item.use,
+        )),
+    }
+
+
+def _review_document(review):
+    return {
+        'title': _clip(review.item_name),
+        'subtitle': _clip(review.comment),
+        'body': ' '.join(str(p or '') for p in (
+            review.item_key, review.comment, review.submitted_by_name, review.submitted_by_email,
+        )),
+    }
+
+
+def _request_document(req):
+    return {
+        'title': _clip(f'{req.request_id} — {req.student_name}'),
+        'subtitle': _clip(req.purpose),
+        'body': ' '.join(str(p or '') for p in (
+            req.student_name, req.student_id, req.email, req.teacher_name, req.purpose,
+        )),
+    }
+
+
+# model -> (doc_type, document builder, fields the document is built from)
+INDEXED_MODELS = {
+    InventoryItem: ('inventory', _inventory_document,
+                    {'name', 'item_key', 'category', 'cabinet', 'type', 'description', 'use'}),
+    UserReview: ('review', _review_document,
+                 {'item_name', 'item_key', 'comment', 'submitted_by_name', 'submitted_by_email'}),
+    BorrowRequest: ('request', _request_document,
+                    {'request_id', 'student_name', 'student_id', 'email', 'teacher_name', 'purpose'}),
+}
+
+
+def document_for(instance):
+    """Return `(doc_type, fields)` for a model instance."""
+    doc_type, build, _fields = INDEXED_MODELS[type(instance)]
+    return doc_type, build(instance)
+
+
+def index_instance(instance, update_fields=None):
+    """Create or refresh the search document of `instance`.
+
+    Saves limited to non-searchable fields (e.g. stock updates) are skipped.
+    """
+    _doc_type, _build, fields = INDEXED_MODELS[type(instance)]
+    if update_fields is not None and not fields & set(update_fields):
+        return
+    doc_type, values = document_for(instance)
+    SearchDocument.objects.update_or_create(doc_type=doc_type, object_id=instance.pk, defaults=values)
+
+
+def index_instances(instances):
+    """Replace the search documents of many instances of one model in two queries.
+
+    For bulk writes (`bulk_create`/`bulk_update`), which send no signals.
+    """
+    instances = [instance for instance in instances if instance.pk is not None]
+    if not instances:
+        return 0
+    doc_type = INDEXED_MODELS[type(instances[0])][0]
+    SearchDocument.objects.filter(doc_type=doc_type, object_id__in=[i.pk for i in instances]).delete()
+    SearchDocument.objects.bulk_create([
+        SearchDocument(doc_type=doc_type, object_id=instance.pk, **document_for(instance)[1])
+        for instance in instances
+    ])
+    return len(instances)
+
+
+def unindex_instance(instance):
+    doc_type = INDEXED_MODELS[type(instance)][0]
+    SearchDocument.objects.filter(doc_type=doc_type, object_id=instance.pk).delete()
+
+
+def rebuild_index(model, batch_size=1000):
+    """Replace every search document of `model`; returns the number indexed."""
+    doc_type = INDEXED_MODELS[model][0]
+    SearchDocument.objects.filter(doc_type=doc_type).delete()
+    total = 0
+    batch = []
+    for instance in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+        _doc_type, values = document_for(instance)
+        batch.append(SearchDocument(doc_type=doc_type, object_id=instance.pk, **values))
+        if len(batch) >= batch_size:
+            SearchDocument.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        SearchDocument.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def search_terms(text):
+    """Alphanumeric terms of a user query, safe to embed in tsquery/FTS5 syntax."""
+    return re.findall(r'\w+', text or '')[:MAX_TERMS]
+
+
+def _has_fts5():
+    global _fts_available
+    if _fts_available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+_RANKED_SQL = """
+    SELECT doc_type, object_id, title, subtitle, rank FROM (
+        SELECT ranked.*, ROW_NUMBER() OVER (
+            PARTITION BY doc_type ORDER BY rank DESC, object_id DESC
+        ) AS position
+        FROM ({matches}) ranked
+    ) numbered
+    WHERE position <= %s
+    ORDER BY doc_type, position
+"""
+
+_POSTGRES_MATCHES = """
+    SELECT d.doc_type, d.object_id, d.title, d.subtitle, ts_rank(d.search_vector, q.query) AS rank
+    FROM api_searchdocument d, to_tsquery('simple', %s) AS q(query)
+    WHERE d.search_vector @@ q.query AND d.doc_type IN ({types})
+"""
+
+_SQLITE_MATCHES = """
+    SELECT d.doc_type, d.object_id, d.title, d.subtitle, -bm25(api_searchdocument_fts, 10.0, 1.0) AS rank
+    FROM api_searchdocument_fts
+    JOIN api_searchdocument d ON d.id = api_searchdocument_fts.rowid
+    WHERE api_searchdocument_fts MATCH %s AND d.doc_type IN ({types})
+"""
+
+
+def _ranked_rows(terms, doc_types, limit):
+    placeholders = ', '.join(['%s'] * len(doc_types))
+    if connection.vendor == 'postgresql':
+        matches = _POSTGRES_MATCHES.format(types=placeholders)
+        query = ' & '.join(f'{term}:*' for term in terms)
+    else:
+        matches = _SQLITE_MATCHES.format(types=placeholders)
+        query = ' AND '.join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(_RANKED_SQL.format(matches=matches), [query, *doc_types, limit])
+        return cursor.fetchall()
+
+
+def _fallback_rows(terms, doc_types, limit):
+    rows = []
+    for doc_type in doc_types:
+        qs = SearchDocument.objects.filter(doc_type=doc_type)
+        for term in terms:
+            qs = qs.filter(Q(title__icontains=term) | Q(body__icontains=term))
+        for object_id, title, subtitle in qs.order_by('-object_id').values_list('object_id', 'title', 'subtitle')[:limit]:
+            rows.append((doc_type, object_id, title, subtitle, 0.0))
+    return rows
+
+
+def search(text, doc_types=DOC_TYPES, limit=10):
+    """Return `{doc_type: [{id, title, subtitle, rank}, ...]}`, best matches first."""
+    terms = search_terms(text)
+    results = {doc_type: [] for doc_type in doc_types}
+    if not terms or not doc_types:
+        return results
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    if connection.vendor == 'postgresql' or (connection.vendor == 'sqlite' and _has_fts5()):
+        rows = _ranked_rows(terms, list(doc_types), limit)
+    else:
+        rows = _fallback_rows(terms, doc_types, limit)
+    for doc_type, object_id, title, subtitle, rank in rows:
+        results[doc_type].append({
+            'id': object_id,
+            'title': title,
+            'subtitle': subtitle,
+            'rank': round(float(rank or 0), 4),
+        })
+    return results
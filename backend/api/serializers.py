@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -12,51 +13,130 @@ class UserSerializer(serializers.ModelSerializer):
 from .models import InventoryItem
 
 from .models import UserReview
-from .models import BorrowRequest, BorrowRequestItem
+from .models import BorrowRequest, BorrowRequestItem, Job
+from .availability import active_borrowed_for, apply_counter_changes, reserve_stock, snapshot
+from .inventory_links import link_inventory_items
+from .images import media_url_builder, variant_urls
+from django.db import models, transaction
 
 
-class InventoryItemSerializer(serializers.ModelSerializer):
+class MediaImageField(serializers.ImageField):
+    """ImageField whose URL comes from the request-scoped media URL builder."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        if not getattr(self, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return value.name
+        return media_url_builder(self.context.get('request'))(value.name)
+
+
+class MediaURLMixin:
+    """Serializer mixin that builds media URLs once per request instead of per row."""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: MediaImageField,
+    }
+
+    def media_url(self, name):
+        return media_url_builder(self.context.get('request'))(name)
+
+
+class InventoryItemSerializer(MediaURLMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    active_borrowed = serializers.SerializerMethodField()
+    current_stock = serializers.SerializerMethodField()
 
     class Meta:
         model = InventoryItem
-        fields = ['id', 'item_key', 'name', 'category', 'stock', 'cabinet', 'description', 'type', 'use', 'image', 'image_url']
-        read_only_fields = ['image_url']
+        fields = [
+            'id', 'item_key', 'name', 'category', 'stock', 'cabinet', 'description', 'type', 'use',
+            'image', 'image_url', 'image_width', 'image_height', 'image_variants',
+            'active_borrowed', 'reserved_units', 'current_stock',
+        ]
+        read_only_fields = [
+            'image_url', 'image_width', 'image_height', 'image_variants',
+            'active_borrowed', 'reserved_units', 'current_stock',
+        ]
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj, url_for=media_url_builder(self.context.get('request')))
+
+    def get_active_borrowed(self, obj):
+        return active_borrowed_for(obj)
+
+    def get_current_stock(self, obj):
+        # Derived from the live `stock` value so it stays correct after set_stock
+        return int(obj.stock or 0) - active_borrowed_for(obj)
 
     def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and hasattr(obj.image, 'url'):
-            if request is not None:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+        if obj.image:
+            return self.media_url(obj.image.name)
         return None
 
 
-class UserReviewSerializer(serializers.ModelSerializer):
+class UserReviewSerializer(MediaURLMixin, serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = UserReview
-        fields = ['id', 'item_name', 'item_key', 'comment', 'image', 'image_url', 'submitted_by_name', 'submitted_by_email', 'created_at']
-        read_only_fields = ['id', 'image_url', 'created_at']
+        fields = [
+            'id', 'item_name', 'item_key', 'inventory_item', 'comment', 'image', 'image_url',
+            'image_width', 'image_height', 'image_variants', 'submitted_by_name', 'submitted_by_email', 'created_at',
+        ]
+        read_only_fields = ['id', 'inventory_item', 'image_url', 'image_width', 'image_height', 'image_variants', 'created_at']
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj, url_for=media_url_builder(self.context.get('request')))
+
+    def create(self, validated_data):
+        review = UserReview(**validated_data)
+        link_inventory_items([review])
+        review.save()
+        return review
 
     def get_image_url(self, obj):
-        request = self.context.get('request')
-        if obj.image and hasattr(obj.image, 'url'):
-            if request is not None:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+        if obj.image:
+            return self.media_url(obj.image.name)
         return None
 
 
 class BorrowRequestItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = BorrowRequestItem
-        fields = ['id', 'item_name', 'item_key', 'quantity', 'item_image', 'status', 'admin_remark', 'remark_type', 'remark_created_at']
-        read_only_fields = []
+        fields = ['id', 'item_name', 'item_key', 'inventory_item', 'quantity', 'item_image', 'status', 'admin_remark', 'remark_type', 'remark_created_at']
+        read_only_fields = ['inventory_item']
 
 
-class BorrowRequestItemDetailSerializer(serializers.ModelSerializer):
+class FieldProjectionMixin:
+    """Serializer mixin that accepts a `fields` kwarg to restrict the output fields.
+
+    Unknown names are ignored; if none of the requested names exist the full
+    field set is kept.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            keep = set(fields) & set(self.fields)
+            if keep:
+                for name in set(self.fields) - keep:
+                    self.fields.pop(name)
+
+    def model_paths(self):
+        """ORM lookup paths backing the selected fields, suitable for `.only()`."""
+        paths = []
+        for field in self.fields.values():
+            if field.source == '*':
+                continue
+            paths.append(field.source.replace('.', '__'))
+        return paths
+
+
+class BorrowRequestItemDetailSerializer(FieldProjectionMixin, serializers.ModelSerializer):
     """Detailed serializer for individual item history with parent request info."""
     request_id = serializers.CharField(source='borrow_request.request_id', read_only=True)
     student_name = serializers.CharField(source='borrow_request.student_name', read_only=True)
@@ -81,6 +161,16 @@ class BorrowRequestItemDetailSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class ItemLoanSerializer(BorrowRequestItemDetailSerializer):
+    """Loan history row for one inventory item; expects the `loan_days` annotation."""
+    loan_days = serializers.IntegerField(read_only=True)
+    actual_returned_at = serializers.DateTimeField(read_only=True)
+
+    class Meta(BorrowRequestItemDetailSerializer.Meta):
+        fields = BorrowRequestItemDetailSerializer.Meta.fields + ['actual_returned_at', 'loan_days']
+        read_only_fields = fields
+
+
 class BorrowRequestSerializer(serializers.ModelSerializer):
     items = BorrowRequestItemSerializer(many=True)
     
@@ -90,19 +180,25 @@ class BorrowRequestSerializer(serializers.ModelSerializer):
             'id', 'request_id', 'student_name', 'student_id', 'email',
             'teacher_name', 'purpose', 'borrow_date', 'return_date',
             'status', 'created_at', 'updated_at', 'admin_remark', 'remark_type',
-            'items'
+            'overdue_notified_at', 'items'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'overdue_notified_at']
     
+    @transaction.atomic
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         borrow_request = BorrowRequest.objects.create(**validated_data)
-        for item_data in items_data:
-            BorrowRequestItem.objects.create(borrow_request=borrow_request, **item_data)
+        created = [BorrowRequestItem(borrow_request=borrow_request, **item_data) for item_data in items_data]
+        locked = reserve_stock([], snapshot(created))
+        link_inventory_items(created)
+        BorrowRequestItem.objects.bulk_create(created)
+        apply_counter_changes([], snapshot(created), locked=locked)
         return borrow_request
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', None)
+        before = snapshot(instance.items.all()) if items_data is not None else None
         
         # Update main request fields
         for attr, value in validated_data.items():
@@ -128,7 +224,25 @@ class BorrowRequestSerializer(serializers.ModelSerializer):
             else:
                 # Full replace: clear existing items and recreate
                 instance.items.all().delete()
-                for item_data in items_data:
-                    BorrowRequestItem.objects.create(borrow_request=instance, **item_data)
+                created = [BorrowRequestItem(borrow_request=instance, **item_data) for item_data in items_data]
+                link_inventory_items(created)
+                BorrowRequestItem.objects.bulk_create(created)
+            after = snapshot(instance.items.all())
+            # Rolls the whole update back when the new items do not fit in stock
+            locked = reserve_stock(before, after)
+            apply_counter_changes(before, after, locked=locked)
         
-        return instance
\ No newline at end of file
+        return instance
+
+
+class JobSerializer(MediaURLMixin, serializers.ModelSerializer):
+    """Status of a background job; `artifact_url` is set once it produced a file."""
+    artifact_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'result', 'error', 'artifact_url', 'attempts', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_artifact_url(self, obj):
+        return self.media_url(obj.artifact.name) if obj.artifact else None
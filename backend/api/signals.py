@@ -0,0 +1,54 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .conditional import bump_catalog_version
+from .images import needs_variants, schedule_variants
+from .inventory_links import link_orphans
+from .models import BorrowRequest, InventoryItem, InventoryTombstone, UserReview
+from .search import index_instance, unindex_instance
+
+
+@receiver(post_save, sender=InventoryItem)
+def link_new_inventory_item(sender, instance, created, raw=False, **kwargs):
+    """Attach earlier requests and reviews that referenced this item's key."""
+    if created and not raw:
+        link_orphans(instance)
+
+
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_delete, sender=InventoryItem)
+def change_catalog_version(sender, instance, **kwargs):
+    """Move the catalog ETag on with every saved or deleted item."""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_save, sender=UserReview)
+@receiver(post_save, sender=BorrowRequest)
+def update_search_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep the object's SearchDocument in step with its searchable fields."""
+    if not raw:
+        index_instance(instance, update_fields=update_fields)
+
+
+@receiver(post_save, sender=InventoryItem)
+@receiver(post_save, sender=UserReview)
+def queue_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Resize newly uploaded or replaced images off the request thread."""
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    if needs_variants(instance):
+        schedule_variants(instance)
+
+
+@receiver(post_delete, sender=InventoryItem)
+@receiver(post_delete, sender=UserReview)
+@receiver(post_delete, sender=BorrowRequest)
+def remove_search_document(sender, instance, **kwargs):
+    unindex_instance(instance)
+
+
+@receiver(post_delete, sender=InventoryItem)
+def record_inventory_tombstone(sender, instance, **kwargs):
+    """Log deleted items so delta sync clients can drop them from their caches."""
+    InventoryTombstone.objects.create(item_id=instance.pk, item_key=instance.item_key)
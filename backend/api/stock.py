@@ -0,0 +1,94 @@
+"""Bulk stock changes for inventory items.
+
+`apply_stock_changes` applies many absolute (`stock`) and relative (`delta`)
+changes with a single UPDATE whose per-row value is a CASE expression, so a
+full stocktake is one statement that only touches `stock` and `updated_at`.
+Relative changes use `F('stock') + delta` and are therefore safe against
+concurrent writers.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .conditional import bump_catalog_version
+from .models import InventoryItem
+from .supabase_sync import enqueue_item_ids
+
+
+MAX_STOCK_ENTRIES = 2000
+
+
+class StockUpdateError(ValueError):
+    """Raised when one or more stock entries are invalid."""
+
+    def __init__(self, errors):
+        super().__init__('invalid stock entries')
+        self.errors = errors
+
+
+def _parse_entries(entries):
+    """Fold entries into `{item_key: ('set' | 'add', value)}`, applied in order."""
+    errors = []
+    changes = {}
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            errors.append({'index': index, 'detail': 'entry must be an object'})
+            continue
+        item_key = entry.get('item_key') or entry.get('itemKey')
+        if not item_key:
+            errors.append({'index': index, 'detail': 'item_key required'})
+            continue
+        has_stock = entry.get('stock') is not None
+        has_delta = entry.get('delta') is not None
+        if has_stock == has_delta:
+            errors.append({'index': index, 'item_key': item_key, 'detail': 'exactly one of stock or delta required'})
+            continue
+        try:
+            value = int(entry['stock'] if has_stock else entry['delta'])
+        except (TypeError, ValueError):
+            errors.append({'index': index, 'item_key': item_key, 'detail': 'invalid stock' if has_stock else 'invalid delta'})
+            continue
+
+        if has_stock:
+            changes[item_key] = ('set', value)
+        else:
+            mode, current = changes.get(item_key, ('add', 0))
+            changes[item_key] = (mode, current + value)
+    if errors:
+        raise StockUpdateError(errors)
+    return changes
+
+
+def apply_stock_changes(entries):
+    """Apply `[{item_key, stock | delta}, ...]` atomically.
+
+    Returns `(updated_item_ids, not_found_keys)`. Raises StockUpdateError
+    without writing anything if any entry is malformed.
+    """
+    changes = _parse_entries(entries)
+    if not changes:
+        return [], []
+
+    with transaction.atomic():
+        found = dict(
+            InventoryItem.objects.select_for_update()
+            .filter(item_key__in=list(changes))
+            .order_by('item_key')
+            .values_list('item_key', 'id')
+        )
+        not_found = [key for key in changes if key not in found]
+        whens = []
+        for item_key, (mode, value) in changes.items():
+            if item_key not in found:
+                continue
+            new_value = Value(value) if mode == 'set' else F('stock') + Value(value)
+            whens.append(When(item_key=item_key, then=new_value))
+        if whens:
+            InventoryItem.objects.filter(id__in=list(found.values())).update(
+                stock=Case(*whens, default=F('stock'), output_field=IntegerField()),
+                updated_at=timezone.now(),
+            )
+            bump_catalog_version()
+            # one outbox row per item; the sync worker pushes them as a single batch
+            enqueue_item_ids(found.values())
+    return list(found.values()), not_found
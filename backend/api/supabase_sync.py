@@ -0,0 +1,161 @@
+"""Outbox-based synchronisation of inventory rows to the Supabase mirror table.
+
+Stock endpoints only call `enqueue_item_sync`, which records an
+`InventorySyncOutbox` row in the caller's transaction and returns immediately.
+`drain_outbox` (run by `manage.py sync_supabase`) claims due rows, coalesces
+them per item and pushes the items' current state with one bulk upsert per
+batch over a pooled `requests.Session`, rescheduling failures with
+exponential backoff. After MAX_ATTEMPTS failed pushes a row is marked failed
+and left for `manage.py sync_supabase --retry-failed`.
+
+Changes are queued whether or not Supabase is configured, so nothing made
+before the credentials are set (or while they are missing) is lost; the
+first drain after configuring pushes it all.
+"""
+import logging
+import os
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import InventoryItem, InventorySyncOutbox
+
+
+logger = logging.getLogger(__name__)
+
+SYNC_FIELDS = ['item_key', 'name', 'category', 'stock', 'cabinet', 'description', 'type', 'use']
+
+# Claimed rows are hidden from other workers for this long while a batch is sent
+CLAIM_LEASE = timedelta(minutes=2)
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 30 * 60
+# Failed pushes before a row is given up on (about 100 minutes of backoff)
+MAX_ATTEMPTS = 12
+REQUEST_TIMEOUT = 10
+
+_session = None
+
+
+def get_config():
+    """Return `(base_url, service_key, table)` or None when Supabase is not configured."""
+    supabase_url = getattr(settings, 'SUPABASE_URL', '') or os.environ.get('SUPABASE_URL')
+    service_key = getattr(settings, 'SUPABASE_SERVICE_ROLE_KEY', '') or os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    if not supabase_url or not service_key:
+        return None
+    table = getattr(settings, 'SUPABASE_TABLE_NAME', '') or os.environ.get('SUPABASE_TABLE_NAME', 'inventory')
+    return supabase_url.rstrip('/'), service_key, table
+
+
+def get_session():
+    """Process-wide session so TCP/TLS connections are reused between batches."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _session = session
+    return _session
+
+
+def enqueue_item_sync(items):
+    """Record that `items` changed; call inside the transaction that changed them."""
+    return enqueue_item_ids([item.pk for item in items if item.pk is not None])
+
+
+def enqueue_item_ids(item_ids):
+    """Like `enqueue_item_sync` but for primary keys, e.g. after a queryset update()."""
+    rows = [InventorySyncOutbox(item_id=pk) for pk in item_ids]
+    InventorySyncOutbox.objects.bulk_create(rows)
+    return len(rows)
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS))
+
+
+def _claim(batch_size):
+    """Lease up to `batch_size` distinct items' due outbox rows and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = (
+            InventorySyncOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, failed_at__isnull=True)
+            .order_by('id')
+        )
+        rows = []
+        item_ids = set()
+        for row in due[:batch_size * 5]:
+            if row.item_id not in item_ids and len(item_ids) >= batch_size:
+                continue
+            item_ids.add(row.item_id)
+            rows.append(row)
+        if rows:
+            InventorySyncOutbox.objects.filter(id__in=[r.id for r in rows]).update(next_attempt_at=now + CLAIM_LEASE)
+    return rows
+
+
+def _push(items, config, session):
+    base_url, service_key, table = config
+    headers = {
+        'Content-Type': 'application/json',
+        'apikey': service_key,
+        'Authorization': f'Bearer {service_key}',
+        'Prefer': 'resolution=merge-duplicates,return=minimal',
+    }
+    body = [dict({'id': item.id}, **{f: getattr(item, f) for f in SYNC_FIELDS}) for item in items]
+    resp = session.post(
+        f'{base_url}/rest/v1/{table}',
+        params={'on_conflict': 'id'},
+        json=body,
+        headers=headers,
+        timeout=REQUEST_TIMEOUT,
+    )
+    resp.raise_for_status()
+
+
+def drain_outbox(batch_size=200, session=None):
+    """Push one batch of pending changes. Returns `(items_synced, rows_failed)`."""
+    config = get_config()
+    if config is None:
+        return 0, 0
+    rows = _claim(batch_size)
+    if not rows:
+        return 0, 0
+
+    # Coalesce: every row for an item collapses into one upsert of its current state
+    item_ids = {row.item_id for row in rows}
+    items = list(InventoryItem.objects.filter(id__in=item_ids).only('id', *SYNC_FIELDS))
+    try:
+        if items:
+            _push(items, config, session or get_session())
+    except Exception as exc:
+        logger.warning('Supabase sync of %d items failed: %s', len(items), exc)
+        now = timezone.now()
+        given_up = 0
+        for row in rows:
+            row.attempts += 1
+            row.next_attempt_at = now + backoff_delay(row.attempts)
+            row.last_error = str(exc)[:1000]
+            if row.attempts >= MAX_ATTEMPTS:
+                row.failed_at = now
+                given_up += 1
+        InventorySyncOutbox.objects.bulk_update(rows, ['attempts', 'next_attempt_at', 'last_error', 'failed_at'])
+        if given_up:
+            logger.error('Supabase sync gave up on %d outbox rows after %d attempts', given_up, MAX_ATTEMPTS)
+        return 0, len(rows)
+
+    InventorySyncOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+    return len(items), 0
+
+
+def retry_failed():
+    """Put failed outbox rows back in the queue with a fresh attempt budget."""
+    return InventorySyncOutbox.objects.filter(failed_at__isnull=False).update(
+        failed_at=None, attempts=0, next_attempt_at=timezone.now(),
+    )
@@ -1,3 +1,485 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import jobs, supabase_sync
+from .conditional import bump_catalog_version
+from .models import BorrowRequest, BorrowRequestItem, InventoryItem, InventorySyncOutbox, Job
+from .transitions import apply_request_action
+
+
+def make_request(request_id, items, status='pending'):
+    """Create a BorrowRequest with `items` given as `(item_key, quantity, item_status)`."""
+    borrow_request = BorrowRequest.objects.create(
+        request_id=request_id,
+        student_name='Student',
+        student_id='2024-0001',
+        email='student@example.com',
+        teacher_name='Teacher',
+        purpose='Lab',
+        borrow_date=date(2026, 1, 5),
+        return_date=date(2026, 1, 9),
+        status=status,
+    )
+    BorrowRequestItem.objects.bulk_create([
+        BorrowRequestItem(borrow_request=borrow_request, item_name=key, item_key=key, quantity=qty, status=item_status)
+        for key, qty, item_status in items
+    ])
+    return borrow_request
+
+
+class QueryCountTests(TestCase):
+    """List, history and export endpoints cost the same number of queries for any row count."""
+
+    def add_rows(self, count):
+        start = InventoryItem.objects.count()
+        for n in range(start, start + count):
+            key = f'item-{n:04d}'
+            InventoryItem.objects.create(item_key=key, name=f'Item {n}', stock=10)
+            make_request(f'REQ-{n:04d}', [(key, 1, 'borrowed'), (key, 2, 'returned')], status='borrowed')
+
+    def queries_for(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_rows(3)
+        small = self.queries_for(url)
+        self.add_rows(20)
+        self.assertEqual(self.queries_for(url), small, url)
+        return small
+
+    def test_borrower_export(self):
+        # requests + their prefetched items
+        self.assertEqual(self.assertConstantQueries('/api/borrow-requests/export_borrowers_xlsx/'), 2)
+
+    def test_inventory_export(self):
+        self.assertEqual(self.assertConstantQueries('/api/inventory/export_xlsx/'), 1)
+
+    def test_inventory_list(self):
+        self.assertConstantQueries('/api/inventory/')
+
+    def test_history(self):
+        self.assertConstantQueries('/api/borrow-requests/history/')
+        self.assertConstantQueries('/api/borrow-requests/history/?page_size=10')
+
+    def test_borrow_request_list(self):
+        self.assertConstantQueries('/api/borrow-requests/')
+
+
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        self.loan = make_request('REQ-LATE', [('beaker', 1, 'borrowed')], status='borrowed')
+
+    def sweep(self, *args):
+        call_command('sweep_overdue', '--as-of', '2026-02-01', *args, stdout=io.StringIO())
+        self.loan.refresh_from_db()
+
+    def test_preview_does_not_mark_notified(self):
+        self.sweep()
+        self.assertIsNone(self.loan.overdue_notified_at)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.sweep('--send')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIsNotNone(self.loan.overdue_notified_at)
+
+
+class StockCheckTests(TestCase):
+    def setUp(self):
+        InventoryItem.objects.create(item_key='beaker', name='Beaker', stock=5)
+
+    def test_approve_refuses_more_than_available(self):
+        first = make_request('REQ-1', [('beaker', 3, 'pending')])
+        second = make_request('REQ-2', [('beaker', 3, 'pending')])
+        results = apply_request_action([first.request_id, second.request_id], 'approve')
+        self.assertEqual([r['ok'] for r in results], [True, False])
+        self.assertEqual(InventoryItem.objects.get(item_key='beaker').borrowed_units, 3)
+
+    def test_approve_refuses_closed_requests(self):
+        rejected = make_request('REQ-7', [('beaker', 1, 'approved')], status='rejected')
+        returned = make_request('REQ-8', [('beaker', 1, 'pending')], status='returned')
+        open_request = make_request('REQ-9', [('beaker', 1, 'pending')])
+        results = apply_request_action([rejected.request_id, returned.pk, open_request.pk], 'approve')
+        self.assertEqual([r['ok'] for r in results], [False, False, True])
+        self.assertEqual(results[0]['error'], 'invalid status: cannot approve a rejected request')
+        self.assertEqual(InventoryItem.objects.get(item_key='beaker').borrowed_units, 1)
+        self.assertEqual(rejected.items.get().status, 'approved')
+
+        response = self.client.post(f'/api/borrow-requests/{returned.pk}/approve/')
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn('shortages', response.json())
+
+    def test_reject_releases_reserved_units(self):
+        borrow_request = make_request('REQ-5', [('beaker', 2, 'pending')])
+        response = self.client.patch(
+            f'/api/borrow-requests/{borrow_request.pk}/',
+            {'status': 'approved', 'items': [{'item_name': 'Beaker', 'item_key': 'beaker', 'quantity': 2, 'status': 'approved'}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        item_url = f"/api/inventory/{InventoryItem.objects.get(item_key='beaker').pk}/"
+        self.assertEqual(self.client.get(item_url).json()['reserved_units'], 2)
+
+        response = self.client.post(f'/api/borrow-requests/{borrow_request.pk}/reject/', {'remark': 'lab closed'})
+        self.assertEqual(response.status_code, 200)
+        item = self.client.get(item_url).json()
+        self.assertEqual((item['reserved_units'], item['current_stock']), (0, 5))
+        self.assertEqual(list(borrow_request.items.values_list('status', flat=True)), ['rejected'])
+        borrow_request.refresh_from_db()
+        self.assertEqual((borrow_request.status, borrow_request.admin_remark), ('rejected', 'lab closed'))
+        # the released units can be loaned again
+        other = make_request('REQ-6', [('beaker', 5, 'pending')])
+        self.assertTrue(apply_request_action([other.pk], 'approve')[0]['ok'])
+
+    def test_items_without_inventory_row_are_not_loaned(self):
+        # a key no inventory item carries (e.g. renamed since) and a keyless item
+        stale = make_request('REQ-13', [('old-beaker', 1, 'pending')])
+        keyless = make_request('REQ-14', [('', 1, 'pending')])
+        results = apply_request_action([stale.pk, keyless.pk], 'approve')
+        self.assertEqual([r['ok'] for r in results], [False, False])
+        self.assertEqual(results[0]['shortages'], [{'item_key': 'old-beaker', 'requested': 1, 'available': 0}])
+        self.assertEqual(stale.items.get().status, 'pending')
+
+        item = keyless.items.get()
+        response = self.client.patch(
+            f'/api/borrow-requests/{keyless.pk}/update_item_statuses/',
+            {'items': [{'id': item.pk, 'status': 'borrowed'}], 'allow_partial': True}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['partial'][0]['approved'], 0)
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'pending')
+
+    def test_create_with_approved_items_checks_stock(self):
+        payload = {
+            'request_id': 'REQ-3', 'student_name': 'Student', 'student_id': '2024-0001',
+            'email': 'student@example.com', 'teacher_name': 'Teacher', 'purpose': 'Lab',
+            'borrow_date': '2026-01-05', 'return_date': '2026-01-09',
+            'items': [{'item_name': 'Beaker', 'item_key': 'beaker', 'quantity': 6, 'status': 'approved'}],
+        }
+        response = self.client.post('/api/borrow-requests/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['shortages'], [{'item_key': 'beaker', 'requested': 6, 'available': 5}])
+        self.assertFalse(BorrowRequest.objects.filter(request_id='REQ-3').exists())
+
+        payload['items'][0]['quantity'] = 5
+        response = self.client.post('/api/borrow-requests/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(InventoryItem.objects.get(item_key='beaker').reserved_units, 5)
+
+    def test_update_replacing_items_checks_stock(self):
+        borrow_request = make_request('REQ-4', [('beaker', 1, 'pending')])
+        response = self.client.patch(
+            f'/api/borrow-requests/{borrow_request.pk}/',
+            {'items': [{'item_name': 'Beaker', 'item_key': 'beaker', 'quantity': 9, 'status': 'borrowed'}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(borrow_request.items.values_list('quantity', 'status')), [(1, 'pending')])
+        self.assertEqual(InventoryItem.objects.get(item_key='beaker').borrowed_units, 0)
+
+
+class ItemTransitionTests(TestCase):
+    def setUp(self):
+        InventoryItem.objects.create(item_key='beaker', name='Beaker', stock=5)
+
+    def patch_items(self, borrow_request, items):
+        return self.client.patch(
+            f'/api/borrow-requests/{borrow_request.pk}/update_item_statuses/',
+            {'items': items}, content_type='application/json',
+        )
+
+    def test_illegal_moves_are_refused(self):
+        returned = make_request('REQ-10', [('beaker', 1, 'returned')], status='returned')
+        rejected = make_request('REQ-11', [('beaker', 1, 'rejected')], status='rejected')
+        for borrow_request, new_status in ((returned, 'borrowed'), (rejected, 'approved')):
+            item = borrow_request.items.get()
+            response = self.patch_items(borrow_request, [{'id': item.pk, 'status': new_status}])
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cannot change status', response.json()['errors'][0]['detail'])
+            item.refresh_from_db()
+            self.assertNotEqual(item.status, new_status)
+        self.assertEqual(InventoryItem.objects.get(item_key='beaker').borrowed_units, 0)
+
+    def test_legal_moves_and_remarks_are_applied(self):
+        borrow_request = make_request('REQ-12', [('beaker', 1, 'borrowed')], status='borrowed')
+        item = borrow_request.items.get()
+        response = self.patch_items(borrow_request, [{'id': item.pk, 'status': 'borrowed', 'admin_remark': 'scratched'}])
+        self.assertEqual(response.status_code, 200)
+        response = self.patch_items(borrow_request, [{'id': item.pk, 'status': 'returned'}])
+        self.assertEqual(response.status_code, 200)
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.admin_remark), ('returned', 'scratched'))
+
+
+class CatalogCacheTests(TestCase):
+    """Cached catalog responses follow writes made without any cache hooks, as from another process."""
+
+    def setUp(self):
+        cache.clear()
+        self.item = InventoryItem.objects.create(item_key='beaker', name='Beaker', stock=5)
+
+    def write_elsewhere(self, **changes):
+        changes.setdefault('updated_at', timezone.now())
+        InventoryItem.objects.filter(pk=self.item.pk).update(**changes)
+        bump_catalog_version()
+
+    def test_list_is_not_served_stale(self):
+        first = self.client.get('/api/inventory/')
+        self.assertEqual(first.json()[0]['stock'], 5)
+        with self.assertNumQueries(1):  # validators are always read; the page comes from the cache
+            self.assertEqual(self.client.get('/api/inventory/').json(), first.json())
+
+        self.write_elsewhere(stock=7)
+        stale = self.client.get('/api/inventory/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.json()[0]['stock'], 7)
+        self.assertEqual(self.client.get('/api/inventory/', HTTP_IF_NONE_MATCH=stale['ETag']).status_code, 304)
+
+    def test_list_follows_deletes(self):
+        InventoryItem.objects.create(item_key='flask', name='Flask', stock=2)
+        self.assertEqual(len(self.client.get('/api/inventory/').json()), 2)
+        InventoryItem.objects.filter(item_key='flask').delete()
+        self.assertEqual(len(self.client.get('/api/inventory/').json()), 1)
+
+    def test_write_committed_out_of_timestamp_order_changes_the_etag(self):
+        # a slower transaction stamps its row before another one that commits first
+        InventoryItem.objects.create(item_key='flask', name='Flask', stock=2)
+        first = self.client.get('/api/inventory/')
+        self.write_elsewhere(stock=7, updated_at=self.item.updated_at)
+        response = self.client.get('/api/inventory/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['stock'], 7)
+
+    def test_item_is_not_served_stale(self):
+        url = f'/api/inventory/{self.item.pk}/'
+        first = self.client.get(url)
+        self.write_elsewhere(borrowed_units=2)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['current_stock'], 3)
+
+
+class StubSupabaseHandler(BaseHTTPRequestHandler):
+    """Answers each upsert with the next status in `server.statuses` and records the body."""
+
+    def do_POST(self):
+        self.server.bodies.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        self.send_response(self.server.statuses.pop(0))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SupabaseSyncTests(TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubSupabaseHandler)
+        self.server.statuses = []
+        self.server.bodies = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.configured = override_settings(
+            SUPABASE_URL=f'http://127.0.0.1:{self.server.server_port}', SUPABASE_SERVICE_ROLE_KEY='key',
+        )
+        self.item = InventoryItem.objects.create(item_key='beaker', name='Beaker', stock=5)
+
+    def drain(self):
+        with self.configured:
+            return supabase_sync.drain_outbox()
+
+    def make_due(self):
+        InventorySyncOutbox.objects.update(next_attempt_at=timezone.now())
+
+    def test_changes_are_queued_without_configuration(self):
+        supabase_sync.enqueue_item_sync([self.item])
+        self.server.statuses = [201]
+        self.assertEqual(self.drain(), (1, 0))
+        self.assertEqual(self.server.bodies[0][0]['item_key'], 'beaker')
+        self.assertFalse(InventorySyncOutbox.objects.exists())
+
+    def test_server_errors_are_retried(self):
+        supabase_sync.enqueue_item_sync([self.item])
+        self.server.statuses = [503]
+        with self.assertLogs('api.supabase_sync', 'WARNING'):
+            self.assertEqual(self.drain(), (0, 1))
+        row = InventorySyncOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertIn('503', row.last_error)
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        self.assertEqual(self.drain(), (0, 0))  # backing off
+
+        self.make_due()
+        self.server.statuses = [201]
+        self.assertEqual(self.drain(), (1, 0))
+        self.assertFalse(InventorySyncOutbox.objects.exists())
+
+    def test_rows_are_given_up_after_max_attempts(self):
+        supabase_sync.enqueue_item_sync([self.item])
+        self.server.statuses = [500, 500]
+        with mock.patch.object(supabase_sync, 'MAX_ATTEMPTS', 2), self.assertLogs('api.supabase_sync', 'WARNING') as logs:
+            for _attempt in range(2):
+                self.make_due()
+                self.assertEqual(self.drain(), (0, 1))
+        self.assertIn('gave up on 1 outbox rows', logs.output[-1])
+        row = InventorySyncOutbox.objects.get()
+        self.assertIsNotNone(row.failed_at)
+        self.make_due()
+        self.assertEqual(self.drain(), (0, 0))
+        self.assertEqual(len(self.server.bodies), 2)
+
+        self.server.statuses = [201]
+        with self.configured:
+            call_command('sync_supabase', '--retry-failed', stdout=io.StringIO())
+        self.assertFalse(InventorySyncOutbox.objects.exists())
+
+
+class InventoryImportTests(TestCase):
+    url = '/api/inventory/import_xlsx/'
+
+    def upload(self, content, name='items.csv'):
+        return self.client.post(self.url, {'file': SimpleUploadedFile(name, content, content_type='text/csv')})
+
+    def test_unreadable_csv_is_a_bad_request(self):
+        latin1 = 'item_key,name,stock\nbeaker,Becher aus Glas \xe4,3\n'.encode('latin-1')
+        response = self.upload(latin1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.json()['detail'])
+
+        # csv.Error: a field over csv.field_size_limit()
+        response = self.upload(b'item_key,name,stock\nbeaker,"' + b'x' * 200000 + b'",3\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(InventoryItem.objects.exists())
+
+    def test_rolled_back_import_reports_no_writes(self):
+        response = self.upload(b'item_key,name,stock\nbeaker,Beaker,3\nflask,Flask,many\n')
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertEqual((data['created'], data['updated']), (0, 0))
+        self.assertEqual([e['row'] for e in data['errors']], [3])
+        self.assertFalse(InventoryItem.objects.exists())
+
+        response = self.upload(b'item_key,name,stock\nbeaker,Beaker,3\n')
+        self.assertEqual(response.json()['created'], 1)
+
+
+class JobLeaseTests(TestCase):
+    def test_outcome_of_a_run_whose_lease_expired_is_dropped(self):
+        job = Job.objects.create(kind='slow')
+        [job_id] = jobs.claim_jobs(1)
+
+        def slow(params):
+            # The heartbeat did not get through; the lease ran out and another worker claimed the job
+            self.assertEqual(jobs.claim_jobs(1, now=timezone.now() + jobs.job_lease() * 2), [job.pk])
+            return {'rows': 1}, None
+
+        with mock.patch.dict(jobs.HANDLERS, {'slow': slow}), self.assertLogs('api.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_job(job_id), 'lost')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), ('running', 2, {}))
+
+        with mock.patch.dict(jobs.HANDLERS, {'slow': lambda params: ({'rows': 2}, None)}):
+            self.assertEqual(jobs.run_job(job_id), 'succeeded')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.lease_expires_at), ('succeeded', {'rows': 2}, None))
+
+    def test_worker_keeps_going_after_an_unexpected_error(self):
+        Job.objects.create(kind='export_inventory')
+        Job.objects.create(kind='export_inventory')
+        out = io.StringIO()
+        run = mock.patch.object(jobs, 'run_job', side_effect=[RuntimeError('connection lost'), 'succeeded'])
+        with run as run_job, self.assertLogs('api.management.commands.run_worker', 'ERROR'):
+            call_command('run_worker', '--workers', '0', '--purge-days', '0', stdout=out)
+        self.assertEqual(run_job.call_count, 2)
+        self.assertIn('succeeded: 1, failed: 1', out.getvalue())
+
+
+@override_settings(JOB_LEASE_SECONDS=0.3)
+class JobHeartbeatTests(TransactionTestCase):
+    def test_lease_is_renewed_while_the_job_runs(self):
+        job = Job.objects.create(kind='slow')
+        [job_id] = jobs.claim_jobs(1)
+        claimed_until = Job.objects.get(pk=job_id).lease_expires_at
+
+        def slow(params):
+            time.sleep(1)
+            leased = Job.objects.get(pk=job_id).lease_expires_at
+            # renewed in the meantime, so no other worker could claim it
+            self.assertGreater(leased, claimed_until + timedelta(seconds=0.5))
+            self.assertEqual(jobs.claim_jobs(1), [])
+            return {}, None
+
+        with mock.patch.dict(jobs.HANDLERS, {'slow': slow}):
+            self.assertEqual(jobs.run_job(job_id), 'succeeded')
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 1)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentApprovalTests(TransactionTestCase):
+    """Approvals racing on the same items neither oversell nor deadlock."""
+
+    def test_parallel_approvals(self):
+        InventoryItem.objects.bulk_create([
+            InventoryItem(item_key='alpha', name='Alpha', stock=10),
+            InventoryItem(item_key='bravo', name='Bravo', stock=10),
+            InventoryItem(item_key='charlie', name='Charlie', stock=10, reserved_units=8),
+        ])
+        # Each request needs 2 units of two items, listed in different orders;
+        # the third item only sees counter-only changes (already approved units)
+        requests = [
+            make_request(f'RACE-{n}', [
+                ('bravo', 2, 'pending'), ('alpha', 2, 'pending'), ('charlie', 1, 'approved'),
+            ] if n % 2 else [
+                ('alpha', 2, 'pending'), ('charlie', 1, 'approved'), ('bravo', 2, 'pending'),
+            ])
+            for n in range(8)
+        ]
+        results = []
+        errors = []
+        barrier = threading.Barrier(len(requests))
+
+        def approve(borrow_request):
+            try:
+                barrier.wait()
+                results.extend(apply_request_action([borrow_request.request_id], 'approve'))
+            except Exception as exc:  # deadlocks surface here as OperationalError
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=approve, args=(req,)) for req in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sum(r['ok'] for r in results), 5)
+        counters = {
+            item.item_key: (item.borrowed_units, item.reserved_units)
+            for item in InventoryItem.objects.all()
+        }
+        self.assertEqual(counters, {'alpha': (10, 0), 'bravo': (10, 0), 'charlie': (5, 3)})
@@ -0,0 +1,466 @@
+"""Bulk status transitions for borrow request items.
+
+`apply_item_updates` replaces the old per-item get()/save() loop used by
+`BorrowRequestViewSet.update_item_statuses`. All targeted items are loaded in
+one query, validated up front, and written with bulk_update/bulk_create and a
+single delete inside one transaction that holds a row lock on the parent
+request, so the query count no longer depends on the number of items.
+
+`apply_request_action` does the same for whole requests, letting the admin
+queue approve, reject or return many requests in a single call.
+
+Both paths refuse to oversell: before writing, the InventoryItem rows of every
+item that would start counting against stock are locked in `item_key` order
+and checked against `stock - borrowed_units - reserved_units`. A request that
+does not fit is rejected as a whole (InsufficientStock) unless the caller asks
+for a partial approval, in which case only the available units are loaned out.
+"""
+import uuid
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .availability import (
+    BORROWED_STATUS, InsufficientStock, apply_counter_changes, available_units, counted_items_q,
+    find_shortages, lock_snapshots, net_demand, snapshot,
+)
+from .models import BorrowRequest, BorrowRequestItem
+
+
+ITEM_STATUSES = {value for value, _label in BorrowRequestItem.STATUS_CHOICES}
+
+# Statuses that mean the units have left (or are about to leave) the lab
+LOAN_STATUSES = ('approved', 'borrowed')
+# Item statuses still waiting for a decision; rejecting a request closes them
+OPEN_STATUSES = ('pending', 'approved')
+
+# Item status moves accepted by apply_item_updates; re-sending the current
+# status (e.g. with a remark) is always allowed. Rejected and returned are final.
+ALLOWED_TRANSITIONS = {
+    'pending': {'approved', 'borrowed', 'rejected'},
+    'approved': {'pending', 'borrowed', 'rejected', 'returned'},
+    'borrowed': {'returned'},
+    'rejected': set(),
+    'returned': set(),
+}
+
+UPDATABLE_FIELDS = ['status', 'quantity', 'admin_remark', 'remark_type', 'remark_created_at', 'actual_returned_at']
+
+
+class TransitionError(ValueError):
+    """Raised when one or more requested item updates are invalid."""
+
+    def __init__(self, errors):
+        super().__init__('invalid item updates')
+        self.errors = errors
+
+
+def parse_timestamp(value):
+    """Parse an ISO datetime (or date) string into an aware datetime, or None."""
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            # fallback: treat as date string (YYYY-MM-DD)
+            d = datetime.fromisoformat(value)
+            parsed = timezone.make_aware(d) if d.tzinfo is None else d
+        return parsed
+    except Exception:
+        return None
+
+
+def _validate(items_data):
+    """Return a list of `{index, id, detail}` errors for malformed updates."""
+    errors = []
+    for index, item_update in enumerate(items_data):
+        if not isinstance(item_update, dict):
+            errors.append({'index': index, 'id': None, 'detail': 'item update must be an object'})
+            continue
+        item_id = item_update.get('id')
+        if 'status' in item_update and str(item_update['status']).lower() not in ITEM_STATUSES:
+            errors.append({'index': index, 'id': item_id, 'detail': f"invalid status '{item_update['status']}'"})
+        if 'quantity' in item_update:
+            try:
+                if int(item_update['quantity']) < 1:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append({'index': index, 'id': item_id, 'detail': 'quantity must be a positive integer'})
+    return errors
+
+
+def _coerce_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _trim_loans(loan_items, loan_quantities, shortages):
+    """Reduce loan quantities, latest items first, until each shortage is covered."""
+    for shortage in shortages:
+        excess = shortage['requested'] - shortage['available']
+        for item_id in reversed(list(loan_items)):
+            if excess <= 0:
+                break
+            if (loan_items[item_id].item_key or '') != shortage['item_key']:
+                continue
+            take = min(excess, loan_quantities[item_id])
+            loan_quantities[item_id] -= take
+            excess -= take
+
+
+def apply_item_updates(borrow_request, items_data, allow_partial=False):
+    """Apply `items_data` updates to the items of `borrow_request` in one transaction.
+
+    Each entry is `{ "id": ..., "status"?, "quantity"?, "admin_remark"?,
+    "remark_type"?, "remark_created_at"?, "actual_returned_at"? }`. Items that
+    transition into approved/borrowed are moved into a new borrowed
+    BorrowRequest representing the actual loan.
+
+    Loans are checked against available stock. Without `allow_partial` a
+    shortage raises InsufficientStock; with it, each loan is cut down to the
+    available units and the remainder stays on the original item with its
+    previous status (reported in `partial`). Status changes must follow
+    ALLOWED_TRANSITIONS.
+
+    Returns a dict with the refreshed `borrow_request`, `updated_count`,
+    `skipped_ids`, the created loan request (or None) as `new_loan` and
+    `partial`. Raises TransitionError or InsufficientStock without writing
+    anything.
+    """
+    errors = _validate(items_data)
+    if errors:
+        raise TransitionError(errors)
+
+    with transaction.atomic():
+        # Lock the parent so concurrent transitions on the same request serialize
+        borrow_request = BorrowRequest.objects.select_for_update().get(pk=borrow_request.pk)
+
+        wanted_ids = {_coerce_id(u.get('id')) for u in items_data if u.get('id')}
+        wanted_ids.discard(None)
+        items = {
+            it.id: it
+            for it in BorrowRequestItem.objects.filter(borrow_request=borrow_request, id__in=wanted_ids)
+        }
+        # Counter contributions before any change, for the availability counters
+        before = snapshot(items.values())
+        original = {it.id: (it.status, it.quantity) for it in items.values()}
+
+        now = timezone.now()
+        changed = {}
+        loan_items = {}
+        skipped_ids = []
+        illegal = []
+        updated_count = 0
+        for index, item_update in enumerate(items_data):
+            raw_id = item_update.get('id')
+            if not raw_id:
+                continue
+            item_obj = items.get(_coerce_id(raw_id))
+            if item_obj is None:
+                skipped_ids.append(raw_id)
+                continue
+
+            old_status = item_obj.status
+            if 'status' in item_update:
+                item_obj.status = str(item_update['status']).lower()
+                if item_obj.status != old_status and item_obj.status not in ALLOWED_TRANSITIONS[old_status]:
+                    illegal.append({
+                        'index': index, 'id': raw_id,
+                        'detail': f"cannot change status from '{old_status}' to '{item_obj.status}'",
+                    })
+                # If item is being marked returned, record actual_returned_at if provided
+                if item_obj.status == 'returned':
+                    actual_val = item_update.get('actual_returned_at') or item_update.get('actualReturnedAt')
+                    item_obj.actual_returned_at = parse_timestamp(actual_val) or now
+            if 'quantity' in item_update:
+                item_obj.quantity = int(item_update['quantity'])
+            # support per-item admin remark fields
+            if 'admin_remark' in item_update:
+                item_obj.admin_remark = item_update.get('admin_remark')
+            if 'remark_type' in item_update:
+                item_obj.remark_type = item_update.get('remark_type')
+            if 'remark_created_at' in item_update:
+                item_obj.remark_created_at = parse_timestamp(item_update.get('remark_created_at'))
+
+            # Ensure items that already are returned have a timestamp
+            if item_obj.status == 'returned' and not item_obj.actual_returned_at:
+                item_obj.actual_returned_at = now
+
+            updated_count += 1
+            # Loan entries are only created when an item transitions into approved/borrowed
+            if old_status not in LOAN_STATUSES and item_obj.status in LOAN_STATUSES:
+                loan_items[item_obj.id] = item_obj
+                changed.pop(item_obj.id, None)
+            elif item_obj.id not in loan_items:
+                changed[item_obj.id] = item_obj
+
+        if illegal:
+            raise TransitionError(illegal)
+
+        # Check availability with the affected inventory rows locked
+        loan_quantities = {item_id: it.quantity for item_id, it in loan_items.items()}
+
+        def proposed():
+            loans = [(it.item_key, BORROWED_STATUS, loan_quantities[i]) for i, it in loan_items.items()]
+            return snapshot(changed.values()) + loans
+
+        # Every key whose counters may move, locked once in key order; trimming
+        # loans below only lowers quantities, so the key set cannot grow later
+        locked = lock_snapshots(before, proposed())
+        demand = net_demand(before, proposed())
+        shortages = find_shortages(demand, locked)
+        if shortages and allow_partial:
+            _trim_loans(loan_items, loan_quantities, shortages)
+            shortages = find_shortages(net_demand(before, proposed()), locked)
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        partial = []
+        for item_id in list(loan_items):
+            item_obj = loan_items[item_id]
+            granted = loan_quantities[item_id]
+            if granted == item_obj.quantity:
+                continue
+            partial.append({
+                'id': item_id,
+                'item_key': item_obj.item_key,
+                'requested': item_obj.quantity,
+                'approved': granted,
+            })
+            # The units that could not be loaned stay on the original item
+            item_obj.quantity -= granted
+            item_obj.status = original[item_id][0]
+            changed[item_id] = item_obj
+            if not granted:
+                del loan_items[item_id]
+
+        if changed:
+            BorrowRequestItem.objects.bulk_update(list(changed.values()), UPDATABLE_FIELDS)
+
+        new_loan = None
+        new_loan_items = []
+        if loan_items:
+            # Group all approved items from this request into a single new BorrowRequest
+            new_loan = BorrowRequest.objects.create(
+                request_id=f"{borrow_request.request_id}-{uuid.uuid4().hex[:8]}",
+                student_name=borrow_request.student_name,
+                student_id=borrow_request.student_id,
+                email=borrow_request.email,
+                teacher_name=borrow_request.teacher_name,
+                purpose=borrow_request.purpose,
+                borrow_date=borrow_request.borrow_date,
+                return_date=borrow_request.return_date,
+                status='borrowed',
+            )
+            # copy per-item fields (including admin remarks) into the new loan items
+            new_loan_items = BorrowRequestItem.objects.bulk_create([
+                BorrowRequestItem(
+                    borrow_request=new_loan,
+                    item_name=it.item_name,
+                    item_key=it.item_key,
+                    inventory_item_id=it.inventory_item_id,
+                    quantity=loan_quantities[it.id],
+                    status='borrowed',
+                    item_image=it.item_image,
+                    admin_remark=it.admin_remark,
+                    remark_type=it.remark_type,
+                    remark_created_at=it.remark_created_at,
+                )
+                for it in loan_items.values()
+            ])
+            # remove the original items from the parent request to avoid duplicates
+            moved = [item_id for item_id in loan_items if item_id not in changed]
+            if moved:
+                BorrowRequestItem.objects.filter(id__in=moved).delete()
+
+        apply_counter_changes(before, snapshot(changed.values()) + snapshot(new_loan_items), locked=locked)
+
+        # If every remaining item has been returned, close the parent request
+        counts = borrow_request.items.aggregate(
+            total=Count('id'),
+            open=Count('id', filter=~Q(status='returned')),
+        )
+        if counts['total'] and not counts['open'] and borrow_request.status == 'borrowed':
+            borrow_request.status = 'returned'
+            borrow_request.save(update_fields=['status', 'updated_at'])
+
+    return {
+        'borrow_request': borrow_request,
+        'updated_count': updated_count,
+        'skipped_ids': skipped_ids,
+        'new_loan': new_loan,
+        'partial': partial,
+    }
+
+
+# Parent status written by each batch action
+REQUEST_ACTIONS = {
+    'approve': 'borrowed',
+    'reject': 'rejected',
+    'mark_returned': 'returned',
+}
+
+# Parent statuses an action may start from; actions not listed accept any
+ACTION_FROM_STATUSES = {
+    'approve': ('pending', 'approved'),
+}
+
+MAX_BATCH_SIZE = 500
+
+
+def _resolve_requests(refs):
+    """Map each ref (numeric pk or public request_id) to a locked BorrowRequest.
+
+    Numeric refs are tried as primary keys first and then as request_ids,
+    mirroring the lookup used by `update_item_statuses`.
+    """
+    pks = {_coerce_id(ref) for ref in refs} - {None}
+    request_ids = {str(ref) for ref in refs}
+    rows = BorrowRequest.objects.select_for_update().filter(Q(pk__in=pks) | Q(request_id__in=request_ids)).order_by('pk')
+    by_pk = {}
+    by_request_id = {}
+    for row in rows:
+        by_pk[row.pk] = row
+        by_request_id[row.request_id] = row
+    resolved = []
+    for ref in refs:
+        pk = _coerce_id(ref)
+        resolved.append(by_pk.get(pk) if pk in by_pk else by_request_id.get(str(ref)))
+    return resolved
+
+
+def _approve_with_stock(requests):
+    """Loan out the open items of `requests` as far as stock allows.
+
+    Requests are considered in order and each one either fits completely or
+    is left untouched; items with no inventory row never fit. Returns `(approved_ids, {request_pk: shortages})`.
+    """
+    open_items = list(
+        BorrowRequestItem.objects
+        .filter(borrow_request__in=requests, status__in=['pending', 'approved'])
+        .only('id', 'borrow_request_id', 'item_key', 'status', 'quantity')
+    )
+    by_request = {}
+    for item in open_items:
+        by_request.setdefault(item.borrow_request_id, []).append(item)
+
+    demands = {}
+    for req in requests:
+        items = by_request.get(req.pk, [])
+        loaned = [(it.item_key, BORROWED_STATUS, it.quantity) for it in items]
+        demands[req.pk] = net_demand(snapshot(items), loaned)
+    # Lock every open item's row, not only those with positive demand, so the
+    # counter update below takes no further locks
+    locked = lock_snapshots(snapshot(open_items))
+    remaining = {key: available_units(item) for key, item in locked.items()}
+
+    approved_ids = []
+    failed = {}
+    for req in requests:
+        demand = demands[req.pk]
+        shortages = [
+            {'item_key': key, 'requested': units, 'available': max(remaining.get(key, 0), 0)}
+            for key, units in sorted(demand.items())
+            if units > remaining.get(key, 0)
+        ]
+        if shortages:
+            failed[req.pk] = shortages
+            continue
+        for key, units in demand.items():
+            if key in remaining:
+                remaining[key] -= units
+        approved_ids.append(req.pk)
+
+    approved_items = [it for pk in approved_ids for it in by_request.get(pk, [])]
+    if approved_items:
+        before = snapshot(approved_items)
+        BorrowRequestItem.objects.filter(id__in=[it.id for it in approved_items]).update(status=BORROWED_STATUS)
+        apply_counter_changes(before, [(it.item_key, BORROWED_STATUS, it.quantity) for it in approved_items], locked=locked)
+    return approved_ids, failed
+
+
+def apply_request_action(refs, action, remark='', remark_type='', actual_returned_at=None):
+    """Apply approve/reject/mark_returned to many borrow requests at once.
+
+    All matching requests are locked and updated with one UPDATE per table
+    inside a single transaction. Approving marks the requests' pending and
+    approved items borrowed; a request whose items do not fit in the available
+    stock is skipped with an `insufficient stock` error, and one that is no
+    longer pending or approved with an `invalid status` error. Rejecting marks the
+    open items rejected and releases their reserved units. Returns one result
+    dict per ref, in order, with either the new status or an `error`.
+    """
+    new_status = REQUEST_ACTIONS[action]
+    now = timezone.now()
+    returned_at = parse_timestamp(actual_returned_at) or now
+
+    with transaction.atomic():
+        resolved = _resolve_requests(refs)
+        allowed = ACTION_FROM_STATUSES.get(action)
+        # Checked on the locked rows, before any counter moves
+        refused = {
+            req.pk: req.status for req in resolved
+            if req is not None and allowed is not None and req.status not in allowed
+        }
+        target_ids = {req.pk for req in resolved if req is not None and req.pk not in refused}
+        failed = {}
+        if action == 'approve' and target_ids:
+            ordered = list({req.pk: req for req in resolved if req is not None and req.pk in target_ids}.values())
+            approved_ids, failed = _approve_with_stock(ordered)
+            target_ids = set(approved_ids)
+
+        if target_ids:
+            updates = {'status': new_status, 'updated_at': now}
+            # Optionally capture remark from admin (reject only, as in the single-request action)
+            if action == 'reject':
+                if remark:
+                    updates['admin_remark'] = remark
+                if remark_type:
+                    updates['remark_type'] = remark_type
+            BorrowRequest.objects.filter(pk__in=target_ids).update(**updates)
+            if action == 'reject':
+                open_items = list(
+                    BorrowRequestItem.objects
+                    .filter(borrow_request_id__in=target_ids, status__in=OPEN_STATUSES)
+                    .only('id', 'item_key', 'status', 'quantity')
+                )
+                apply_counter_changes(snapshot(open_items), [])
+                BorrowRequestItem.objects.filter(id__in=[it.id for it in open_items]).update(status='rejected')
+            if action == 'mark_returned':
+                counted = (
+                    BorrowRequestItem.objects
+                    .filter(counted_items_q(), borrow_request_id__in=target_ids)
+                    .only('item_key', 'status', 'quantity')
+                )
+                apply_counter_changes(snapshot(counted), [])
+                BorrowRequestItem.objects.filter(borrow_request_id__in=target_ids).update(
+                    status='returned', actual_returned_at=returned_at,
+                )
+
+    results = []
+    for ref, req in zip(refs, resolved):
+        if req is None:
+            results.append({'ref': ref, 'ok': False, 'error': 'not found'})
+            continue
+        if req.pk in refused:
+            results.append({
+                'ref': ref, 'ok': False, 'id': req.pk, 'request_id': req.request_id,
+                'error': f"invalid status: cannot {action} a {refused[req.pk]} request",
+            })
+            continue
+        if req.pk in failed:
+            results.append({
+                'ref': ref, 'ok': False, 'id': req.pk, 'request_id': req.request_id,
+                'error': 'insufficient stock', 'shortages': failed[req.pk],
+            })
+            continue
+        result = {'ref': ref, 'ok': True, 'id': req.pk, 'request_id': req.request_id, 'status': new_status}
+        if action == 'mark_returned':
+            result['actual_returned_at'] = returned_at.isoformat()
+        results.append(result)
+    return results
@@ -1,20 +1,25 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from accounts.views import GetAllStudents, RegisterView, LoginView
-from .views import UserViewSet, InventoryItemViewSet, UserReviewViewSet, BorrowRequestViewSet
-from .views import SupabaseConfigView
+from accounts.views import GetAllStudents, RegisterView, LoginView, LogoutView
+from .views import UserViewSet, InventoryItemViewSet, UserReviewViewSet, BorrowRequestViewSet, JobViewSet
+from .views import SupabaseConfigView, DashboardStatsView, SearchView, CacheStatsView
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
 router.register(r'inventory', InventoryItemViewSet)
 router.register(r'reviews', UserReviewViewSet)
 router.register(r'borrow-requests', BorrowRequestViewSet)
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
     path('get-students/', GetAllStudents.as_view(), name='get_students'),
     path('supabase-config/', SupabaseConfigView.as_view(), name='supabase_config'),
+    path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard_stats'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
 ]
\ No newline at end of file
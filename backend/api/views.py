@@ -1,27 +1,58 @@
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
 from django.contrib.auth import get_user_model
 from .serializers import UserSerializer, InventoryItemSerializer
 from .serializers import UserReviewSerializer, BorrowRequestSerializer, BorrowRequestItemDetailSerializer
-from .models import InventoryItem, UserReview, BorrowRequest, BorrowRequestItem
+from .serializers import ItemLoanSerializer, JobSerializer
+from .models import InventoryItem, UserReview, BorrowRequest, BorrowRequestItem, InventoryTombstone, Job
+from .availability import with_availability, apply_counter_changes, counted_items_q, snapshot, InsufficientStock
+from .pagination import KeysetPaginator, InvalidCursor, OptionalCatalogPagination
+from .catalog import filter_catalog
+from .transitions import apply_item_updates, apply_request_action, TransitionError, parse_timestamp
+from .transitions import REQUEST_ACTIONS, MAX_BATCH_SIZE
+from .supabase_sync import enqueue_item_sync
+from .stock import apply_stock_changes, StockUpdateError, MAX_STOCK_ENTRIES
+from .conditional import catalog_validators, item_validators
+from .cache import cached, cache_stats
+from .overdue import overdue_requests, with_open_items, build_digests
+from .search import search as run_search, DOC_TYPES as SEARCH_DOC_TYPES
+from .loans import loan_items, loan_stats, current_holders
+from .inventory_import import ImportFormatError, detect_format, import_rows, read_rows
+from .exports import xlsx_response, inventory_rows, borrower_rows, INVENTORY_HEADERS, BORROWER_HEADERS
+from .exports import filter_borrower_requests, borrower_report_filename
+from .jobs import enqueue, store_upload
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.decorators import action
-from django.http import HttpResponse
-import io
-from openpyxl import Workbook
-from django.db.models import Sum
+from rest_framework.reverse import reverse
 import logging
 from rest_framework import status
 from django.conf import settings
-import requests
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 import os
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 
 User = get_user_model()
 
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def _flag(request, name):
+    """True when query parameter (or form field) `name` is set to a true value."""
+    return str(request.query_params.get(name, request.data.get(name, ''))).lower() in TRUE_VALUES
+
+
+def _job_accepted(request, job):
+    """202 response pointing the client at the job's status URL."""
+    return Response(
+        {'job': str(job.pk), 'status': job.status, 'status_url': reverse('job-detail', args=[job.pk], request=request)},
+        status=status.HTTP_202_ACCEPTED,
+    )
+
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -35,6 +66,74 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
     # Allow public GET/POST for now (frontend will post updates)
     permission_classes = [AllowAny]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = OptionalCatalogPagination
+
+    def get_queryset(self):
+        """Annotate items with `active_borrowed`/`current_stock` in the same query."""
+        return with_availability(super().get_queryset())
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            queryset = filter_catalog(queryset, self.request.query_params)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """Catalog list with ETag/Last-Modified; unchanged catalogs get a 304.
+
+        GET /api/inventory/?category=equipment&cabinet=A,B&type=...&in_stock=true
+        GET /api/inventory/?search=digital multimeter
+        GET /api/inventory/?page=2&page_size=50
+        GET /api/inventory/?pagination=cursor&page_size=50  (then follow `next`)
+
+        All parameters are optional; without `page`, `page_size` or a cursor
+        the full (filtered) list is returned unpaginated.
+
+        Validators are read from the database on every request; serialized
+        pages are cached (see `api.cache`) under the ETag, which covers the
+        query string, and, because image and pagination URLs are absolute,
+        by scheme and host.
+        """
+        variant = request.query_params.urlencode()
+        etag, last_modified = catalog_validators(variant)
+
+        def build_response():
+            data = cached(
+                'catalog-list', [etag, request.build_absolute_uri('/')],
+                lambda: super(InventoryItemViewSet, self).list(request, *args, **kwargs).data,
+            )
+            return Response(data)
+
+        return self._conditional_response(request, etag, last_modified, build_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        item = self.get_object()
+        etag, last_modified = item_validators(item)
+
+        def build_response():
+            data = cached(
+                'catalog-item', [etag, request.build_absolute_uri('/')],
+                lambda: self.get_serializer(item).data,
+            )
+            return Response(data)
+
+        return self._conditional_response(request, etag, last_modified, build_response)
+
+    def _conditional_response(self, request, etag, last_modified, build_response):
+        """Answer 304 when the client's validators match, otherwise build the response.
+
+        Responses are marked `no-cache` so clients always revalidate, which is
+        cheap because a matching ETag skips serialization entirely.
+        """
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = build_response()
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, no_cache=True)
+        return response
 
     @action(detail=True, methods=['post'])
     def set_stock(self, request, id=None):
@@ -50,14 +149,11 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
             stock_val = int(stock)
         except (TypeError, ValueError):
             return Response({'detail': 'invalid stock'}, status=status.HTTP_400_BAD_REQUEST)
-        item.stock = stock_val
-        item.save()
-        item.save()
-        # attempt to sync to Supabase table if configured
-        try:
-            self._sync_item_to_supabase(item)
-        except Exception:
-            pass
+        with transaction.atomic():
+            item.stock = stock_val
+            item.save(update_fields=['stock', 'updated_at'])
+            # queue a sync to the Supabase table (pushed by `manage.py sync_supabase`)
+            enqueue_item_sync([item])
         serializer = self.get_serializer(item)
         return Response(serializer.data)
 
@@ -78,126 +174,177 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
         except (TypeError, ValueError):
             return Response({'detail': 'invalid stock'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            item = InventoryItem.objects.get(item_key=item_key)
+            item = self.get_queryset().get(item_key=item_key)
         except InventoryItem.DoesNotExist:
             return Response({'detail': 'not found'}, status=status.HTTP_404_NOT_FOUND)
-        item.stock = stock_val
-        item.save()
-        try:
-            self._sync_item_to_supabase(item)
-        except Exception:
-            pass
+        with transaction.atomic():
+            item.stock = stock_val
+            item.save(update_fields=['stock', 'updated_at'])
+            enqueue_item_sync([item])
         serializer = self.get_serializer(item)
         return Response(serializer.data)
 
-    def _sync_item_to_supabase(self, item, payload=None):
-        """Patch the Supabase REST table row for this item using the service role key.
+    @action(detail=False, methods=['post'])
+    def bulk_set_stock(self, request):
+        """Set or adjust the stock of many items in one transaction.
 
-        Uses SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY from settings or env.
-        Table name is taken from settings.SUPABASE_TABLE_NAME or defaults to 'inventory'.
+        POST /api/inventory/bulk_set_stock/
+        Body: { "items": [ { "item_key": "resistor_1k", "stock": 5 },
+                           { "item_key": "ammeter", "delta": -2 }, ... ] }
+
+        `stock` sets an absolute value, `delta` adds to the current value.
+        Entries are applied in order; unknown keys are reported in `not_found`.
         """
-        supabase_url = getattr(settings, 'SUPABASE_URL', '') or os.environ.get('SUPABASE_URL')
-        service_key = getattr(settings, 'SUPABASE_SERVICE_ROLE_KEY', '') or os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
-        if not supabase_url or not service_key:
-            return False
-        table = getattr(settings, 'SUPABASE_TABLE_NAME', '') or os.environ.get('SUPABASE_TABLE_NAME', 'inventory')
-
-        headers = {
-            'Content-Type': 'application/json',
-            'apikey': service_key,
-            'Authorization': f'Bearer {service_key}',
-            'Prefer': 'return=representation'
-        }
+        entries = request.data.get('items')
+        if not isinstance(entries, list) or not entries:
+            return Response({'detail': 'items array required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(entries) > MAX_STOCK_ENTRIES:
+            return Response({'detail': f'at most {MAX_STOCK_ENTRIES} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            updated_ids, not_found = apply_stock_changes(entries)
+        except StockUpdateError as exc:
+            return Response({'detail': 'invalid stock entries', 'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        items = self.get_queryset().filter(id__in=updated_ids)
+        return Response({
+            'updated_count': len(updated_ids),
+            'not_found': not_found,
+            'items': self.get_serializer(items, many=True).data,
+        })
 
-        if payload is None:
-            body = {
-                'item_key': item.item_key,
-                'name': item.name,
-                'category': item.category,
-                'stock': item.stock,
-                'cabinet': item.cabinet,
-                'description': item.description,
-                'type': item.type,
-                'use': item.use
-            }
-        else:
-            body = payload
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Items changed since a timestamp, plus tombstones for deleted items.
 
-        # prefer match by id if available
-        if getattr(item, 'id', None) is not None:
-            url = f"{supabase_url.rstrip('/')}/rest/v1/{table}?id=eq.{item.id}"
-        else:
-            url = f"{supabase_url.rstrip('/')}/rest/v1/{table}?item_key=eq.{item.item_key}"
+        GET /api/inventory/changes/?since=2026-01-01T00:00:00Z
+        GET /api/inventory/changes/?since=...&cursor=<next_cursor>&page_size=500
+
+        Results are ordered by (updated_at, id) and keyset paginated. `deleted`
+        is only included on the first page. Clients should store `server_time`
+        from the first page and pass it as `since` on their next sync. Without
+        `since` every item is returned. Loans that change an item's
+        availability counters also mark it as changed.
+        """
+        since_param = request.query_params.get('since')
+        since = None
+        if since_param:
+            since = parse_timestamp(since_param)
+            if since is None:
+                return Response({'detail': 'invalid since timestamp'}, status=status.HTTP_400_BAD_REQUEST)
+
+        server_time = timezone.now()
+        queryset = self.get_queryset()
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+
+        paginator = KeysetPaginator('updated_at', descending=False, default_page_size=500, max_page_size=2000)
+        try:
+            rows, next_cursor = paginator.paginate(queryset, request)
+        except InvalidCursor:
+            return Response({'detail': 'invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        deleted = []
+        if since is not None and not request.query_params.get('cursor'):
+            deleted = list(
+                InventoryTombstone.objects.filter(deleted_at__gte=since).values('item_id', 'item_key', 'deleted_at')
+            )
+        return Response({
+            'since': since,
+            'server_time': server_time,
+            'results': self.get_serializer(rows, many=True).data,
+            'deleted': deleted,
+            'next_cursor': next_cursor,
+            'next': paginator.get_next_link(request, next_cursor),
+        })
+
+    @action(detail=True, methods=['get'])
+    def loans(self, request, id=None):
+        """Loan history and utilization statistics for one item.
+
+        GET /api/inventory/{id}/loans/
+        GET /api/inventory/{id}/loans/?status=borrowed
+        GET /api/inventory/{id}/loans/?page_size=50&cursor=<next_cursor>
+
+        `stats` covers every loan of the item (times borrowed, units, unit-days
+        on loan, average loan length in days, distinct borrowers) and
+        `current_holders` lists who has units out right now. `results` is the
+        loan history, newest request first, keyset paginated like
+        /api/borrow-requests/history/; each row carries its `loan_days`.
+        """
+        item = self.get_object()
+        status_filter = request.query_params.get('status')
+        history = loan_items(item).select_related('borrow_request')
+        if status_filter:
+            history = history.filter(status=status_filter)
 
-        resp = requests.patch(url, json=body, headers=headers, timeout=10)
-        return resp.ok
+        paginator = KeysetPaginator('borrow_request__created_at', default_page_size=50, max_page_size=500)
+        try:
+            rows, next_cursor = paginator.paginate(history, request)
+        except InvalidCursor:
+            return Response({'detail': 'invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'item': {'id': item.id, 'item_key': item.item_key, 'name': item.name, 'stock': item.stock},
+            'stats': loan_stats(item),
+            'current_holders': current_holders(item),
+            'results': ItemLoanSerializer(rows, many=True, context={'request': request}).data,
+            'next_cursor': next_cursor,
+            'next': paginator.get_next_link(request, next_cursor),
+        })
 
     @action(detail=False, methods=['get'])
     def export_xlsx(self, request):
         """Export all inventory items as an Excel (.xlsx) file.
 
         GET /api/inventory/export_xlsx/
+        GET /api/inventory/export_xlsx/?async=true  -> 202 with a job to poll (see JobViewSet)
         """
-        qs = InventoryItem.objects.all().order_by('name')
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Inventory"
-        headers = [
-            'id',
-            'name',
-            'category',
-            'type',
-            'use',
-            'cabinet',
-            'stock',
-            'active_borrowed',
-            'current_stock',
-            'description',
-        ]
-        ws.append(headers)
-        for it in qs:
-            image_url = ""
-            try:
-                if getattr(it, 'image', None):
-                    image_field = it.image
-                    if hasattr(image_field, 'url') and self.request is not None:
-                        image_url = self.request.build_absolute_uri(image_field.url)
-            except Exception:
-                image_url = ""
-            # Compute how many units are currently borrowed for this item
-            borrowed_agg = BorrowRequestItem.objects.filter(
-                item_key=getattr(it, 'item_key', None), status__iexact='borrowed'
-            ).aggregate(total=Sum('quantity'))
-            active_borrowed = borrowed_agg.get('total') or 0
-            try:
-                stock_val = int(getattr(it, 'stock', 0) or 0)
-            except Exception:
-                stock_val = 0
-            current_stock = stock_val - int(active_borrowed)
-
-            row = [
-                getattr(it, 'id', ''),
-                getattr(it, 'name', ''),
-                getattr(it, 'category', ''),
-                getattr(it, 'type', ''),
-                getattr(it, 'use', ''),
-                getattr(it, 'cabinet', ''),
-                stock_val,
-                active_borrowed,
-                current_stock,
-                getattr(it, 'description', ''),
-            ]
-            ws.append(row)
-
-        bio = io.BytesIO()
-        wb.save(bio)
-        bio.seek(0)
-        resp = HttpResponse(
-            bio.getvalue(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        resp['Content-Disposition'] = 'attachment; filename="inventory.xlsx"'
-        return resp
+        if _flag(request, 'async'):
+            return _job_accepted(request, enqueue('export_inventory'))
+        qs = with_availability(InventoryItem.objects.all().order_by('name'))
+        return xlsx_response('inventory.xlsx', 'Inventory', INVENTORY_HEADERS, inventory_rows(qs))
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def import_xlsx(self, request):
+        """Create or update items from an uploaded spreadsheet, matched by `item_key`.
+
+        POST /api/inventory/import_xlsx/  (multipart: file=<.xlsx or .csv>)
+        POST /api/inventory/import_xlsx/?dry_run=true  (validate and count only)
+        POST /api/inventory/import_xlsx/?async=true  -> 202 with a job to poll
+
+        Columns are those of `export_xlsx`, so an export can be edited and
+        uploaded back; computed columns are ignored and absent columns are
+        left unchanged. The workbook is read in read-only mode and written
+        in batches inside one transaction. If any row is invalid nothing is
+        saved and the per-row errors are returned with status 400.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'file required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            fmt = detect_format(upload.name)
+        except ImportFormatError:
+            fmt = None
+        if fmt not in ('xlsx', 'csv'):
+            return Response({'detail': 'file must be .xlsx or .csv'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = _flag(request, 'dry_run')
+        if _flag(request, 'async'):
+            params = {'upload': store_upload(upload), 'format': fmt, 'dry_run': dry_run}
+            return _job_accepted(request, enqueue('import_inventory', params))
+
+        try:
+            with transaction.atomic():
+                report = import_rows(read_rows(upload.file, fmt), dry_run=dry_run)
+                if report.errors:
+                    transaction.set_rollback(True)
+                    report.discard()
+        except ImportFormatError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = report.as_dict()
+        data['dry_run'] = dry_run
+        if report.errors:
+            data['detail'] = 'invalid rows; nothing was saved'
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
 
     def get_serializer_context(self):
         # Ensure serializer can build absolute image URLs
@@ -207,6 +354,7 @@ class InventoryItemViewSet(viewsets.ModelViewSet):
 
 
 class SupabaseConfigView(APIView):
+    """Public client configuration; only changes on redeploy, so browsers may cache it."""
     permission_classes = [AllowAny]
 
     def get(self, request):
@@ -220,7 +368,94 @@ class SupabaseConfigView(APIView):
                 or os.environ.get('SUPABASE_STORAGE_BUCKET', '')
             )
         }
-        return Response(data)
+        response = Response(data)
+        patch_cache_control(response, public=True, max_age=300)
+        return response
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of the catalog cache for monitoring.
+
+    GET /api/cache/stats/
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class DashboardStatsView(APIView):
+    """Admin dashboard counters computed with one aggregate query per table.
+
+    GET /api/dashboard/stats/
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        today = timezone.localdate()
+        requests_stats = BorrowRequest.objects.aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status='pending')),
+            borrowed=Count('id', filter=Q(status='borrowed')),
+            returned=Count('id', filter=Q(status='returned')),
+            rejected=Count('id', filter=Q(status='rejected')),
+            overdue=Count('id', filter=Q(status='borrowed', return_date__lt=today)),
+        )
+        item_stats = BorrowRequestItem.objects.aggregate(
+            # requests with at least one pending item, as shown on the Borrow Requests page
+            pending_requests=Count('borrow_request', distinct=True, filter=Q(status='pending')),
+            borrowed_items=Count('id', filter=Q(status__iexact='borrowed')),
+            borrowed_units=Sum('quantity', filter=Q(status__iexact='borrowed')),
+        )
+        review_stats = UserReview.objects.aggregate(
+            total=Count('id'),
+            unresolved=Count('id', filter=Q(is_resolved=False)),
+        )
+        inventory_stats = InventoryItem.objects.aggregate(
+            equipment=Count('id'),
+            total_stock=Sum('stock'),
+        )
+        return Response({
+            'requests': requests_stats,
+            'pending_requests': item_stats['pending_requests'],
+            'borrowed_items': item_stats['borrowed_items'],
+            'borrowed_units': item_stats['borrowed_units'] or 0,
+            'reviews': review_stats,
+            'equipment': inventory_stats['equipment'],
+            'total_stock': inventory_stats['total_stock'] or 0,
+        })
+
+
+class SearchView(APIView):
+    """Ranked full-text search across inventory, reviews and borrow requests.
+
+    GET /api/search/?q=oscilloscope
+    GET /api/search/?q=juan physics&types=request,review&limit=20
+
+    Results are grouped by type (`inventory`, `review`, `request`), best
+    match first, at most `limit` (default 10, max 50) per type. Each term is
+    matched as a word prefix.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        q = request.query_params.get('q', '').strip()
+        if not q:
+            return Response({'detail': 'q required'}, status=status.HTTP_400_BAD_REQUEST)
+        types_param = request.query_params.get('types')
+        doc_types = SEARCH_DOC_TYPES
+        if types_param:
+            doc_types = tuple(t for t in SEARCH_DOC_TYPES if t in {p.strip() for p in types_param.split(',')})
+            if not doc_types:
+                return Response(
+                    {'detail': f"types must be among: {', '.join(SEARCH_DOC_TYPES)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except (TypeError, ValueError):
+            return Response({'detail': 'invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'query': q, 'results': run_search(q, doc_types, limit)})
 
 
 class UserReviewViewSet(viewsets.ModelViewSet):
@@ -233,6 +468,14 @@ class UserReviewViewSet(viewsets.ModelViewSet):
     authentication_classes = []
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
+    def get_queryset(self):
+        """Optionally filter by ?inventory_item=<id> (uses the FK index)."""
+        queryset = super().get_queryset()
+        inventory_item = self.request.query_params.get('inventory_item')
+        if inventory_item and inventory_item.isdigit():
+            queryset = queryset.filter(inventory_item_id=inventory_item)
+        return queryset
+
     def create(self, request, *args, **kwargs):
         # Let DRF handle validation including file upload
         serializer = self.get_serializer(data=request.data)
@@ -274,32 +517,58 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(status=status_filter)
         if student_id:
             queryset = queryset.filter(student_id=student_id)
+        if self.action == 'list':
+            # Nested items for the whole page in one query; writes read them fresh
+            queryset = queryset.prefetch_related('items')
         
         return queryset
+
+    def create(self, request, *args, **kwargs):
+        # Items created as approved/borrowed must fit in the available stock
+        try:
+            return super().create(request, *args, **kwargs)
+        except InsufficientStock as exc:
+            return Response({'detail': 'insufficient stock', 'shortages': exc.shortages}, status=status.HTTP_400_BAD_REQUEST)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except InsufficientStock as exc:
+            return Response({'detail': 'insufficient stock', 'shortages': exc.shortages}, status=status.HTTP_400_BAD_REQUEST)
+
+    def perform_destroy(self, instance):
+        # Deleting a request cascades to its items; release their counted units
+        with transaction.atomic():
+            before = snapshot(instance.items.filter(counted_items_q()))
+            instance.delete()
+            apply_counter_changes(before, [])
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
-        """Approve a borrow request and change status to 'borrowed'."""
+        """Approve a borrow request and change status to 'borrowed'.
+
+        The request's pending/approved items are marked borrowed. Responds 409
+        with the per-item `shortages` when the stock left cannot cover them,
+        and 409 without them when the request is no longer pending or approved.
+        """
         borrow_request = self.get_object()
-        borrow_request.status = 'borrowed'
-        borrow_request.save()
+        result = apply_request_action([borrow_request.pk], 'approve')[0]
+        if not result['ok']:
+            data = {'detail': result['error'], 'request_id': borrow_request.request_id}
+            if 'shortages' in result:
+                data['shortages'] = result['shortages']
+            return Response(data, status=status.HTTP_409_CONFLICT)
         return Response({'status': 'approved', 'request_id': borrow_request.request_id})
     
     @action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
-        """Reject a borrow request."""
+        """Reject a borrow request; its open items are rejected and their reserved units released."""
         borrow_request = self.get_object()
-        borrow_request.status = 'rejected'
-        
         # Optionally capture remark from admin
-        remark = request.data.get('remark', '')
-        remark_type = request.data.get('remark_type', '')
-        if remark:
-            borrow_request.admin_remark = remark
-        if remark_type:
-            borrow_request.remark_type = remark_type
-        
-        borrow_request.save()
+        apply_request_action(
+            [borrow_request.pk], 'reject',
+            remark=request.data.get('remark', ''), remark_type=request.data.get('remark_type', ''),
+        )
         return Response({'status': 'rejected', 'request_id': borrow_request.request_id})
     
     @action(detail=True, methods=['post'])
@@ -308,34 +577,51 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
         borrow_request = self.get_object()
         # Accept optional actual return timestamp (ISO format) from client
         actual_returned_at = request.data.get('actual_returned_at') or request.data.get('actualReturnedAt')
-        parsed_dt = None
-        if actual_returned_at:
-            try:
-                parsed_dt = parse_datetime(actual_returned_at)
-                if parsed_dt is None:
-                    # fallback: treat as date string (YYYY-MM-DD)
-                    try:
-                        from datetime import datetime
-                        d = datetime.fromisoformat(actual_returned_at)
-                        parsed_dt = timezone.make_aware(d) if d.tzinfo is None else d
-                    except Exception:
-                        parsed_dt = None
-            except Exception:
-                parsed_dt = None
-
-        # mark parent request returned
-        borrow_request.status = 'returned'
-        borrow_request.save()
-
-        # update each item to returned and set actual_returned_at
-        items = borrow_request.items.all()
-        for it in items:
-            it.status = 'returned'
-            it.actual_returned_at = parsed_dt or timezone.now()
-            it.save()
-
-        return Response({'status': 'returned', 'request_id': borrow_request.request_id, 'actual_returned_at': (parsed_dt or timezone.now()).isoformat()})
+        # Shares the batch path so items and availability counters update together
+        result = apply_request_action([borrow_request.pk], 'mark_returned', actual_returned_at=actual_returned_at)[0]
+        return Response({
+            'status': 'returned',
+            'request_id': borrow_request.request_id,
+            'actual_returned_at': result['actual_returned_at'],
+        })
     
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Approve, reject or mark returned many requests in one call.
+
+        POST /api/borrow-requests/batch/
+        Body: { "action": "approve" | "reject" | "mark_returned",
+                "ids": [12, "REQ-2024-001", ...],
+                "remark": "...", "remark_type": "...", "actual_returned_at": "..." }
+
+        `ids` may mix numeric DB ids and public `request_id`s. All requests are
+        updated in a single transaction; the response lists one result per id.
+        """
+        action_name = request.data.get('action')
+        refs = request.data.get('ids') or request.data.get('request_ids') or []
+        if action_name not in REQUEST_ACTIONS:
+            return Response(
+                {'detail': f"action must be one of: {', '.join(REQUEST_ACTIONS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not isinstance(refs, list) or not refs:
+            return Response({'detail': 'ids array required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(refs) > MAX_BATCH_SIZE:
+            return Response({'detail': f'at most {MAX_BATCH_SIZE} ids per batch'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = apply_request_action(
+            refs,
+            action_name,
+            remark=request.data.get('remark', ''),
+            remark_type=request.data.get('remark_type', ''),
+            actual_returned_at=request.data.get('actual_returned_at') or request.data.get('actualReturnedAt'),
+        )
+        return Response({
+            'action': action_name,
+            'updated_count': sum(1 for r in results if r['ok']),
+            'results': results,
+        })
+
     @action(detail=False, methods=['get'])
     def currently_borrowed(self, request):
         """Get all currently borrowed items (status='borrowed')."""
@@ -343,6 +629,36 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(borrowed_requests, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def overdue(self, request):
+        """Borrowed requests past their return date.
+
+        GET /api/borrow-requests/overdue/
+        GET /api/borrow-requests/overdue/?as_of=2026-03-01
+        GET /api/borrow-requests/overdue/?group=student
+
+        Each result is a borrow request plus `days_overdue`, most overdue
+        first. `group=student` returns one digest per student instead, the
+        same grouping `manage.py sweep_overdue` uses for reminders.
+        """
+        as_of = timezone.localdate()
+        as_of_param = request.query_params.get('as_of')
+        if as_of_param:
+            parsed = parse_timestamp(as_of_param)
+            if parsed is None:
+                return Response({'detail': 'invalid as_of date'}, status=status.HTTP_400_BAD_REQUEST)
+            as_of = parsed.date()
+
+        queryset = overdue_requests(as_of)
+        if request.query_params.get('group') == 'student':
+            return Response({'as_of': as_of, 'results': build_digests(with_open_items(queryset), as_of)})
+
+        rows = list(queryset.prefetch_related('items'))
+        data = self.get_serializer(rows, many=True).data
+        for row, req in zip(data, rows):
+            row['days_overdue'] = (as_of - req.return_date).days
+        return Response({'as_of': as_of, 'count': len(rows), 'results': data})
+
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Get borrow history as individual items with all statuses.
@@ -350,13 +666,21 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
         GET /api/borrow-requests/history/
         GET /api/borrow-requests/history/?status=returned
         GET /api/borrow-requests/history/?student_id=12345
+        GET /api/borrow-requests/history/?page_size=100&cursor=<next_cursor>
+        GET /api/borrow-requests/history/?fields=id,item_name,status,student_name
         
         Returns individual BorrowRequestItem records with their parent request details.
         Supports filtering by item status and/or student_id.
         Shows all items with any status (pending, approved, rejected, borrowed, returned).
+
+        Passing `page_size` or `cursor` switches to keyset pagination ordered by
+        (borrow_request.created_at, id), newest first, and returns
+        { "results": [...], "next_cursor": ..., "next": ... }. Without them the
+        full list is returned as before. `fields` limits both the serialized
+        fields and the columns loaded from the database.
         """
         # Get all items (not just parent requests)
-        items_queryset = BorrowRequestItem.objects.select_related('borrow_request').order_by('-borrow_request__created_at')
+        items_queryset = BorrowRequestItem.objects.select_related('borrow_request')
         
         # Apply filters
         status_filter = request.query_params.get('status', None)
@@ -366,10 +690,33 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
             items_queryset = items_queryset.filter(status=status_filter)
         if student_id_filter:
             items_queryset = items_queryset.filter(borrow_request__student_id=student_id_filter)
-        
-        # Use detailed serializer to include parent request info
-        serializer = BorrowRequestItemDetailSerializer(items_queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+
+        fields_param = request.query_params.get('fields', '')
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()] or None
+        serializer = BorrowRequestItemDetailSerializer(fields=fields, context={'request': request})
+        # Only load the columns the projected serializer reads (plus ordering keys)
+        items_queryset = items_queryset.only(
+            'id', 'borrow_request', 'borrow_request__created_at', *serializer.model_paths()
+        )
+
+        paginator = KeysetPaginator('borrow_request__created_at')
+        if not paginator.is_requested(request):
+            items_queryset = paginator.order(items_queryset)
+            serializer = BorrowRequestItemDetailSerializer(
+                items_queryset, many=True, fields=fields, context={'request': request}
+            )
+            return Response(serializer.data)
+
+        try:
+            rows, next_cursor = paginator.paginate(items_queryset, request)
+        except InvalidCursor:
+            return Response({'detail': 'invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = BorrowRequestItemDetailSerializer(rows, many=True, fields=fields, context={'request': request})
+        return Response({
+            'results': serializer.data,
+            'next_cursor': next_cursor,
+            'next': paginator.get_next_link(request, next_cursor),
+        })
     
     @action(detail=False, methods=['get'])
     def export_borrowers_xlsx(self, request):
@@ -378,144 +725,33 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
         GET /api/borrow-requests/export_borrowers_xlsx/
         GET /api/borrow-requests/export_borrowers_xlsx/?from_date=2024-01-01&to_date=2024-01-31
         GET /api/borrow-requests/export_borrowers_xlsx/?status=returned
+        GET /api/borrow-requests/export_borrowers_xlsx/?async=true&...  -> 202 with a job to poll
         
         Returns an Excel file with borrower and item information.
         """
-        from datetime import datetime
-        
-        # Get base queryset
-        queryset = BorrowRequest.objects.all().order_by('-created_at')
-        
-        # Apply filters
-        from_date = request.query_params.get('from_date', None)
-        to_date = request.query_params.get('to_date', None)
-        status_filter = request.query_params.get('status', None)
-        student_id_filter = request.query_params.get('student_id', None)
-        
-        if from_date:
-            try:
-                from_dt = datetime.strptime(from_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(created_at__date__gte=from_dt)
-            except ValueError:
-                pass
-        
-        if to_date:
-            try:
-                to_dt = datetime.strptime(to_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(created_at__date__lte=to_dt)
-            except ValueError:
-                pass
-        
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        if student_id_filter:
-            queryset = queryset.filter(student_id=student_id_filter)
-        
-        # Create workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Borrower Report"
-        
-        # Headers
-        headers = [
-            'Request ID',
-            'Date Requested',
-            'Student Name',
-            'Student ID',
-            'Email',
-            'Teacher Name',
-            'Item Name',
-            'Quantity',
-            'Purpose',
-            'Borrow Date',
-            'Return Date',
-            'Actual Return Date',
-            'Status',
-            'Admin Remark',
-        ]
-        ws.append(headers)
-        
-        # Add data rows
-        for req in queryset:
-            # Get all items for this request
-            items = req.items.all()
-            
-            if items.exists():
-                for item in items:
-                    actual_return_date = ''
-                    if hasattr(item, 'actual_returned_at') and item.actual_returned_at:
-                        actual_return_date = item.actual_returned_at.strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    row = [
-                        req.request_id,
-                        req.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                        req.student_name,
-                        req.student_id,
-                        req.email,
-                        req.teacher_name,
-                        item.item_name,
-                        item.quantity,
-                        req.purpose,
-                        req.borrow_date.strftime('%Y-%m-%d') if req.borrow_date else '',
-                        req.return_date.strftime('%Y-%m-%d') if req.return_date else '',
-                        actual_return_date,
-                        item.status,
-                        item.admin_remark or req.admin_remark or '',
-                    ]
-                    ws.append(row)
-            else:
-                # If no items, still show the request
-                row = [
-                    req.request_id,
-                    req.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    req.student_name,
-                    req.student_id,
-                    req.email,
-                    req.teacher_name,
-                    '',
-                    0,
-                    req.purpose,
-                    req.borrow_date.strftime('%Y-%m-%d') if req.borrow_date else '',
-                    req.return_date.strftime('%Y-%m-%d') if req.return_date else '',
-                    '',
-                    req.status,
-                    req.admin_remark or '',
-                ]
-                ws.append(row)
-        
-        # Prepare response
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-        # Create filename with date range if provided
-        filename = 'borrower_report'
-        if from_date and to_date:
-            filename += f'_{from_date}_to_{to_date}'
-        elif from_date:
-            filename += f'_from_{from_date}'
-        elif to_date:
-            filename += f'_to_{to_date}'
-        filename += '.xlsx'
-        
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        if _flag(request, 'async'):
+            params = {
+                name: request.query_params[name]
+                for name in ('from_date', 'to_date', 'status', 'student_id')
+                if request.query_params.get(name)
+            }
+            return _job_accepted(request, enqueue('export_borrowers', params))
+        queryset = filter_borrower_requests(BorrowRequest.objects.all().order_by('-created_at'), request.query_params)
+        filename = borrower_report_filename(request.query_params)
+        return xlsx_response(filename, 'Borrower Report', BORROWER_HEADERS, borrower_rows(queryset))
 
     @action(detail=True, methods=['patch'])
     def update_item_statuses(self, request, pk=None):
         """Update statuses of individual items within a borrow request.
         
         PATCH /api/borrow-requests/{id}/update_item_statuses/
-        Body: { "items": [ { "id": 12, "status": "approved", "quantity": 2 }, ... ] }
+        Body: { "items": [ { "id": 12, "status": "approved", "quantity": 2 }, ... ],
+                "allow_partial": false }
         
         Updates only the items provided by id. Items not included remain unchanged.
         After updating, if all items are approved/rejected, the request status is updated accordingly.
+        Approvals that exceed the available stock are refused with 409 and
+        `shortages`; with `allow_partial` only the available units are loaned.
         """
         logger = logging.getLogger(__name__)
         # Allow callers to use either the numeric DB PK or the public `request_id`
@@ -539,116 +775,24 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
             pass
         items_data = request.data.get('items', [])
         
-        if not items_data:
+        if not items_data or not isinstance(items_data, list):
             return Response({'detail': 'items array required'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Update each item by id and collect approved items to create loan entries
-        approved_items_to_create = []
-        updated_count = 0
-        skipped_ids = []
-        for item_update in items_data:
-            item_id = item_update.get('id')
-            if not item_id:
-                continue
-            try:
-                item_obj = borrow_request.items.get(id=item_id)
-                old_status = item_obj.status
-                if 'status' in item_update:
-                    item_obj.status = item_update['status']
-                    # If item is being marked returned, record actual_returned_at if provided
-                    if str(item_obj.status).lower() == 'returned':
-                        actual_val = item_update.get('actual_returned_at') or item_update.get('actualReturnedAt')
-                        parsed_actual = None
-                        if actual_val:
-                            try:
-                                parsed_actual = parse_datetime(actual_val)
-                                if parsed_actual is None:
-                                    from datetime import datetime
-                                    try:
-                                        d = datetime.fromisoformat(actual_val)
-                                        parsed_actual = timezone.make_aware(d) if d.tzinfo is None else d
-                                    except Exception:
-                                        parsed_actual = None
-                            except Exception:
-                                parsed_actual = None
-                        item_obj.actual_returned_at = parsed_actual or timezone.now()
-                if 'quantity' in item_update:
-                    item_obj.quantity = item_update['quantity']
-                # support per-item admin remark fields
-                if 'admin_remark' in item_update:
-                    item_obj.admin_remark = item_update.get('admin_remark')
-                if 'remark_type' in item_update:
-                    item_obj.remark_type = item_update.get('remark_type')
-                if 'remark_created_at' in item_update:
-                    item_obj.remark_created_at = item_update.get('remark_created_at')
-
-                # Ensure items that already are returned have a timestamp
-                if str(item_obj.status).lower() == 'returned' and not getattr(item_obj, 'actual_returned_at', None):
-                    item_obj.actual_returned_at = timezone.now()
-
-                item_obj.save()
-                updated_count += 1
-
-                # Create loan entries only when item status transitions into approved/borrowed
-                prev_was_borrowed_or_approved = old_status in ('approved', 'borrowed')
-                now_is_borrowed_or_approved = item_obj.status in ('approved', 'borrowed')
-                if (not prev_was_borrowed_or_approved) and now_is_borrowed_or_approved:
-                    approved_items_to_create.append(item_obj)
-            except BorrowRequestItem.DoesNotExist:
-                skipped_ids.append(item_id)
-                continue
-        
+
+        allow_partial = str(request.data.get('allow_partial', '')).lower() in ('1', 'true', 'yes')
+        try:
+            result = apply_item_updates(borrow_request, items_data, allow_partial=allow_partial)
+        except TransitionError as exc:
+            return Response({'detail': 'invalid item updates', 'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except InsufficientStock as exc:
+            return Response({'detail': 'insufficient stock', 'shortages': exc.shortages}, status=status.HTTP_409_CONFLICT)
+
+        borrow_request = result['borrow_request']
+        skipped_ids = result['skipped_ids']
+        updated_count = result['updated_count']
         if skipped_ids:
             print(f"[update_item_statuses] WARNING: item ids not found in request {borrow_request.id}: {skipped_ids}")
         print(f"[update_item_statuses] Updated {updated_count}/{len(items_data)} items")
 
-        # For any approved items, create a new BorrowRequest representing the actual loan(s)
-        # Group all approved items from this request into a single new BorrowRequest
-        created_loans = []
-        if approved_items_to_create:
-            import uuid
-            new_request_id = f"{borrow_request.request_id}-{uuid.uuid4().hex[:8]}"
-            new_req = BorrowRequest.objects.create(
-                request_id=new_request_id,
-                student_name=borrow_request.student_name,
-                student_id=borrow_request.student_id,
-                email=borrow_request.email,
-                teacher_name=borrow_request.teacher_name,
-                purpose=borrow_request.purpose,
-                borrow_date=borrow_request.borrow_date,
-                return_date=borrow_request.return_date,
-                status='borrowed',
-            )
-            for it in approved_items_to_create:
-                # copy per-item fields (including admin remarks) into the new loan item
-                BorrowRequestItem.objects.create(
-                    borrow_request=new_req,
-                    item_name=it.item_name,
-                    item_key=it.item_key,
-                    quantity=it.quantity,
-                    status='borrowed',
-                    item_image=it.item_image,
-                    admin_remark=getattr(it, 'admin_remark', None),
-                    remark_type=getattr(it, 'remark_type', None),
-                    remark_created_at=getattr(it, 'remark_created_at', None),
-                )
-                # remove the original item from the parent request to avoid duplicates
-                try:
-                    it.delete()
-                except Exception:
-                    # best-effort: if delete fails, continue
-                    pass
-            # serialize created loan to include in response
-            created_loans.append(BorrowRequestSerializer(new_req, context={'request': request}).data)
-
-        # Check if all items in the request have been returned and update parent status
-        all_items = borrow_request.items.all()
-        if all_items.exists():
-            all_returned = all(item.status == 'returned' for item in all_items)
-            if all_returned and borrow_request.status == 'borrowed':
-                borrow_request.status = 'returned'
-                borrow_request.save()
-
         # Return updated original request and any created loan entries
         serializer = self.get_serializer(borrow_request)
         payload = {
@@ -656,6 +800,19 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
             'updated_count': updated_count,
             'skipped_ids': skipped_ids,
         }
-        if created_loans:
-            payload['created_loans'] = created_loans
-        return Response(payload)
\ No newline at end of file
+        if result['partial']:
+            payload['partial'] = result['partial']
+        if result['new_loan'] is not None:
+            payload['created_loans'] = [BorrowRequestSerializer(result['new_loan'], context={'request': request}).data]
+        return Response(payload)
+
+
+class JobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Status of a background job started with `?async=true`.
+
+    GET /api/jobs/{id}/  -> poll until `status` is 'succeeded' (then download
+    `artifact_url`) or 'failed' (see `error` and `result`).
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [AllowAny]
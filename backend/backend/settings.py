@@ -91,6 +91,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.LastSeenMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -130,6 +131,18 @@ DATABASES = {
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 AUTH_USER_MODEL = 'accounts.User'
 
+REST_FRAMEWORK = {
+    # Token first (cached, see accounts.authentication), then DRF's defaults
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+}
+
+# Minimum seconds between two last_seen writes for the same user
+LAST_SEEN_INTERVAL = int(os.environ.get('LAST_SEEN_INTERVAL', '300'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -198,3 +211,37 @@ STORAGES = {
     },
 }
 
+
+# Cache used for catalog responses (see api/cache.py). Local memory by default,
+# which is per process; entries are keyed by database-derived ETags, so that is
+# safe with several workers, and CACHE_BACKEND=file or redis (with CACHE_LOCATION)
+# only lets them share hits.
+_cache_backend = os.environ.get('CACHE_BACKEND', 'locmem').lower()
+if _cache_backend == 'redis':
+    _default_cache = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    }
+elif _cache_backend == 'file':
+    _default_cache = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+    }
+else:
+    _default_cache = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "phylab-default",
+    }
+CACHES = {"default": _default_cache}
+
+# Seconds a token -> user lookup stays cached; logout and user saves drop it
+# earlier, but only in the cache they run against. Off with the per-process
+# local memory cache, where another worker could keep accepting a revoked token.
+TOKEN_CACHE_TIMEOUT = int(os.environ.get('TOKEN_CACHE_TIMEOUT', '0' if _cache_backend == 'locmem' else '60'))
+
+# Seconds a cached catalog page / item is kept (writes change its key earlier)
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', '300'))
+
+# Seconds a claimed background job's lease lasts (see api/jobs.py). Running jobs
+# renew it every third of that; a job whose worker stops renewing is run again.
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '300'))
@@ -1,8 +1,52 @@
 // Dashboard statistics and overview
 
 // Dashboard Stats
+async function fetchDashboardStats() {
+  // Server-side aggregate counts (one small response instead of full history)
+  const urls = [
+    window.PHYLAB_API && typeof window.PHYLAB_API === "function"
+      ? window.PHYLAB_API("/api/dashboard/stats/")
+      : "/api/dashboard/stats/",
+    "/api/dashboard/stats/",
+  ];
+  for (const url of urls) {
+    try {
+      const response = await fetch(url, { mode: "cors" });
+      if (response.ok) return await response.json();
+    } catch (e) {
+      continue;
+    }
+  }
+  return null;
+}
+
+function renderDashboardStats(pending, loans, equipment, reviewCount) {
+  document.getElementById("statPending").textContent = pending;
+  document.getElementById("statLoans").textContent = loans;
+  document.getElementById("statEquipment").textContent = equipment;
+  document.getElementById("statReviews").textContent = reviewCount;
+
+  // Update nav badges
+  document.getElementById("pendingCount").textContent = pending;
+  document.getElementById("loansCount").textContent = loans;
+  // Reviews nav badge
+  const reviewsCountEl = document.getElementById("reviewsCount");
+  if (reviewsCountEl) reviewsCountEl.textContent = reviewCount;
+}
+
 async function loadDashboardStats() {
-  // Fetch all borrow requests from backend for stats
+  const stats = await fetchDashboardStats();
+  if (stats) {
+    renderDashboardStats(
+      stats.pending_requests,
+      stats.borrowed_items,
+      stats.equipment,
+      stats.reviews ? stats.reviews.unresolved : 0,
+    );
+    return;
+  }
+
+  // Fallback: fetch all borrow requests from backend and count client-side
   let allRequests = [];
   try {
     const urls = [
@@ -67,17 +111,7 @@ async function loadDashboardStats() {
   }, 0);
   const equipment = document.querySelectorAll(".inventory-card").length;
 
-  document.getElementById("statPending").textContent = pending;
-  document.getElementById("statLoans").textContent = loans;
-  document.getElementById("statEquipment").textContent = equipment;
-  document.getElementById("statReviews").textContent = reviews.length;
-
-  // Update nav badges
-  document.getElementById("pendingCount").textContent = pending;
-  document.getElementById("loansCount").textContent = loans;
-  // Reviews nav badge
-  const reviewsCountEl = document.getElementById("reviewsCount");
-  if (reviewsCountEl) reviewsCountEl.textContent = reviews.length;
+  renderDashboardStats(pending, loans, equipment, reviews.length);
 }
 
 // Dashboard Borrowers List
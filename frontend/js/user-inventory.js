@@ -45,6 +45,15 @@ export function loadInventoryFromAdmin() {
 
     const imageSrc =
       item.image && item.image.trim() ? item.image : placeholderSvg;
+    // Prefer the resized card variant in the grid; width/height avoid layout shift
+    const cardVariant = item.cardImage;
+    const gridSrc = cardVariant ? cardVariant.webp || cardVariant.jpeg : imageSrc;
+    const sizeAttrs = cardVariant
+      ? `width="${cardVariant.width}" height="${cardVariant.height}"`
+      : "";
+    const popupSrc = item.fullImage
+      ? item.fullImage.webp || item.fullImage.jpeg
+      : imageSrc;
 
     let cabinetDisplay = details.cabinet || item.cabinet || "N/A";
     if (
@@ -65,7 +74,7 @@ export function loadInventoryFromAdmin() {
       <button class="details-info-btn" title="View details" type="button">
         <span>ⓘ</span>
       </button>
-      <img class="inventory-image" src="${imageSrc}" alt="${item.name}" onerror="this.onerror=null; this.src='${placeholderSvg}';">
+      <img class="inventory-image" src="${gridSrc}" ${sizeAttrs} loading="lazy" alt="${item.name}" onerror="this.onerror=null; this.src='${placeholderSvg}';">
       <div class="inventory-item-text">
         <span class="inventory-item-name">${item.name}</span>
         <p class="inventory-item-description">${shortDesc}</p>
@@ -84,7 +93,7 @@ export function loadInventoryFromAdmin() {
     `;
 
     // Store item data for details popup
-    card.dataset.itemImage = imageSrc;
+    card.dataset.itemImage = popupSrc;
     card.dataset.itemDescription =
       details.description ||
       item.description ||
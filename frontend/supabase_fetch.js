@@ -86,6 +86,9 @@
         category: item.category || "",
         stock: item.stock != null ? item.stock : 0,
         image: item.image || item.image_url || "",
+        // Resized variants (null until the backend has processed the upload)
+        cardImage: (item.image_variants && item.image_variants.card) || null,
+        fullImage: (item.image_variants && item.image_variants.full) || null,
         cabinet: item.cabinet || "",
         description: item.description || "",
         type: item.type || "",